@@ -0,0 +1,42 @@
+"""Add account balance slots
+
+Revision ID: 333d9f31d21a
+Revises: 4ab9ac49f6d0
+Create Date: 2026-10-18 16:03:41.528714
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '333d9f31d21a'
+down_revision: Union[str, Sequence[str], None] = '4ab9ac49f6d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('accounts', sa.Column('balance_slots', sa.SmallInteger(), server_default='0', nullable=False))
+    op.create_table('account_balance_slots',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('slot', sa.SmallInteger(), nullable=False),
+    sa.Column('balance', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'slot')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # fold whatever is still sitting in the slots back into the main balance
+    op.execute("""
+        UPDATE accounts SET balance = accounts.balance + s.total
+        FROM (SELECT account_id, SUM(balance) AS total FROM account_balance_slots GROUP BY account_id) s
+        WHERE accounts.id = s.account_id
+    """)
+    op.drop_table('account_balance_slots')
+    op.drop_column('accounts', 'balance_slots')
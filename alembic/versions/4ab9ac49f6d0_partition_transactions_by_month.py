@@ -0,0 +1,136 @@
+"""Partition transactions by month
+
+Revision ID: 4ab9ac49f6d0
+Revises: ab5103ee7b67
+Create Date: 2026-10-18 15:12:08.316904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4ab9ac49f6d0'
+down_revision: Union[str, Sequence[str], None] = 'ab5103ee7b67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    "id, source_card_id, dest_card_id, amount, fee_amount, total_amount, type, status, "
+    "ref_number, description, created_at, completed_at"
+)
+
+LEGACY_INDEXES = (
+    'idx_created_at',
+    'idx_dest_created',
+    'idx_source_created',
+    'idx_status_created',
+    'ix_transactions_id',
+    'ix_transactions_ref_number',
+)
+
+# one partition per utc month from the oldest row up to three months ahead,
+# same naming as app.services.partitions so the maintenance command picks them up
+CREATE_MONTHLY_PARTITIONS = """
+    DO $$
+    DECLARE
+        m date;
+    BEGIN
+        FOR m IN
+            SELECT generate_series(
+                date_trunc('month', COALESCE((SELECT MIN(created_at) FROM transactions_legacy), now()) AT TIME ZONE 'UTC'),
+                date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                interval '1 month'
+            )::date
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+                'transactions_y' || to_char(m, 'YYYY') || 'm' || to_char(m, 'MM'),
+                m::text || ' 00:00:00+00',
+                (m + interval '1 month')::date::text || ' 00:00:00+00'
+            );
+        END LOOP;
+    END $$;
+"""
+
+
+def _transaction_columns(created_at_nullable: bool):
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('transactions_id_seq'::regclass)"), nullable=False),
+        sa.Column('source_card_id', sa.Integer(), nullable=True),
+        sa.Column('dest_card_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.BigInteger(), nullable=False),
+        sa.Column('fee_amount', sa.BigInteger(), nullable=True),
+        sa.Column('total_amount', sa.BigInteger(), nullable=False),
+        sa.Column('type', sa.SmallInteger(), nullable=False),
+        sa.Column('status', sa.SmallInteger(), nullable=True),
+        sa.Column('ref_number', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=created_at_nullable),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['dest_card_id'], ['cards.id'], ),
+        sa.ForeignKeyConstraint(['source_card_id'], ['cards.id'], ),
+    ]
+
+
+def _create_indexes(ref_unique: bool):
+    op.create_index('idx_created_at', 'transactions', ['created_at'], unique=False)
+    op.create_index('idx_dest_created', 'transactions', ['dest_card_id', 'created_at'], unique=False)
+    op.create_index('idx_source_created', 'transactions', ['source_card_id', 'created_at'], unique=False)
+    op.create_index('idx_status_created', 'transactions', ['status', 'created_at'], unique=False)
+    op.create_index(op.f('ix_transactions_ref_number'), 'transactions', ['ref_number'], unique=ref_unique)
+
+
+def _detach_legacy():
+    op.rename_table('transactions', 'transactions_legacy')
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE transactions_legacy DROP CONSTRAINT transactions_pkey")
+    for name in LEGACY_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _detach_legacy()
+
+    # the partition key has to be part of every unique constraint, so the primary key becomes
+    # (id, created_at) and ref_number keeps a plain index (the generator already makes it unique)
+    op.create_table('transactions',
+    *_transaction_columns(created_at_nullable=False),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    _create_indexes(ref_unique=False)
+
+    op.execute(CREATE_MONTHLY_PARTITIONS)
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+
+    op.execute(f"""
+        INSERT INTO transactions ({COLUMNS})
+        SELECT id, source_card_id, dest_card_id, amount, fee_amount, total_amount, type, status,
+               ref_number, description, COALESCE(created_at, now()), completed_at
+        FROM transactions_legacy
+    """)
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.drop_table('transactions_legacy')
+    op.execute("ANALYZE transactions")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # only rows still attached come back, partitions detached or archived by the
+    # maintenance command stay where they are
+    _detach_legacy()
+
+    op.create_table('transactions',
+    *_transaction_columns(created_at_nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_transactions_id'), 'transactions', ['id'], unique=False)
+    _create_indexes(ref_unique=True)
+
+    op.execute(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_legacy")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.drop_table('transactions_legacy')
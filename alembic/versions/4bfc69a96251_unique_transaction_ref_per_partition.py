@@ -0,0 +1,32 @@
+"""Unique transaction ref per partition
+
+Revision ID: 4bfc69a96251
+Revises: 5cb1c5be37b3
+Create Date: 2026-10-18 20:41:07.552914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4bfc69a96251'
+down_revision: Union[str, Sequence[str], None] = '5cb1c5be37b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the partition key has to be in the unique index; it leads with ref_number, so it also
+    # serves the lookups the plain index was for
+    op.create_index('uq_transactions_ref_created', 'transactions', ['ref_number', 'created_at'], unique=True)
+    op.drop_index(op.f('ix_transactions_ref_number'), table_name='transactions')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_transactions_ref_number'), 'transactions', ['ref_number'], unique=False)
+    op.drop_index('uq_transactions_ref_created', table_name='transactions')
@@ -0,0 +1,28 @@
+"""Add transactions.imported
+
+Revision ID: 5cb1c5be37b3
+Revises: 9b51991b99ba
+Create Date: 2026-10-18 19:12:40.318255
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5cb1c5be37b3'
+down_revision: Union[str, Sequence[str], None] = '9b51991b99ba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('transactions', sa.Column('imported', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('transactions', 'imported')
@@ -0,0 +1,50 @@
+"""Add card daily spend counters
+
+Revision ID: 6a276d3eeff4
+Revises: 68be55c7726e
+Create Date: 2026-10-18 09:12:41.215870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a276d3eeff4'
+down_revision: Union[str, Sequence[str], None] = '68be55c7726e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('card_daily_spend',
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('transfer_amount', sa.BigInteger(), nullable=False),
+    sa.Column('withdraw_amount', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['cards.id'], ),
+    sa.PrimaryKeyConstraint('card_id', 'day')
+    )
+
+    # backfill from the successful transactions already stored
+    op.execute("""
+        INSERT INTO card_daily_spend (card_id, day, transfer_amount, withdraw_amount)
+        SELECT
+            source_card_id,
+            created_at::date,
+            COALESCE(SUM(amount) FILTER (WHERE type = 2), 0),
+            COALESCE(SUM(amount) FILTER (WHERE type = 1), 0)
+        FROM transactions
+        WHERE status = 1
+          AND source_card_id IS NOT NULL
+          AND created_at IS NOT NULL
+        GROUP BY source_card_id, created_at::date
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('card_daily_spend')
@@ -0,0 +1,46 @@
+"""Add transaction rollups
+
+Revision ID: 79e4079f5b1c
+Revises: 6a276d3eeff4
+Create Date: 2026-10-18 11:02:17.540312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '79e4079f5b1c'
+down_revision: Union[str, Sequence[str], None] = '6a276d3eeff4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('transaction_rollups',
+    sa.Column('scope', sa.SmallInteger(), nullable=False),
+    sa.Column('grain', sa.SmallInteger(), nullable=False),
+    sa.Column('scope_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('tx_count', sa.BigInteger(), nullable=False),
+    sa.Column('amount_sum', sa.BigInteger(), nullable=False),
+    sa.Column('fee_sum', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('scope', 'grain', 'scope_id', 'bucket')
+    )
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('last_transaction_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # existing rows are folded in by the first run of the refresh job
+    op.execute("INSERT INTO rollup_watermarks (name, last_transaction_id) VALUES ('transactions', 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rollup_watermarks')
+    op.drop_table('transaction_rollups')
@@ -0,0 +1,50 @@
+"""Add report jobs
+
+Revision ID: 7b93e2ed93ab
+Revises: 333d9f31d21a
+Create Date: 2026-10-18 17:12:06.304958
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b93e2ed93ab'
+down_revision: Union[str, Sequence[str], None] = '333d9f31d21a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('report_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('params_key', sa.String(length=64), nullable=False),
+    sa.Column('params', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('status', sa.SmallInteger(), nullable=False),
+    sa.Column('attempts', sa.SmallInteger(), nullable=False),
+    sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # one live (pending/running) job per parameter set, the dedup point for concurrent submits
+    op.create_index('uq_report_jobs_live_key', 'report_jobs', ['params_key'], unique=True, postgresql_where=sa.text('status IN (0, 1)'))
+    op.create_index('idx_report_jobs_key_expires', 'report_jobs', ['params_key', 'expires_at'], unique=False)
+    op.create_index('idx_report_jobs_status_created', 'report_jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_report_jobs_status_created', table_name='report_jobs')
+    op.drop_index('idx_report_jobs_key_expires', table_name='report_jobs')
+    op.drop_index('uq_report_jobs_live_key', table_name='report_jobs', postgresql_where=sa.text('status IN (0, 1)'))
+    op.drop_table('report_jobs')
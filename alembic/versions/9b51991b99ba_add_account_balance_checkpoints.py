@@ -0,0 +1,36 @@
+"""Add account balance checkpoints
+
+Revision ID: 9b51991b99ba
+Revises: 7b93e2ed93ab
+Create Date: 2026-10-18 17:58:22.610473
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b51991b99ba'
+down_revision: Union[str, Sequence[str], None] = '7b93e2ed93ab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('account_balance_checkpoints',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('checkpoint_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('balance', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'checkpoint_at')
+    )
+    op.create_index('idx_balance_checkpoints_at', 'account_balance_checkpoints', ['checkpoint_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_balance_checkpoints_at', table_name='account_balance_checkpoints')
+    op.drop_table('account_balance_checkpoints')
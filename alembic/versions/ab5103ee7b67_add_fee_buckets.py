@@ -0,0 +1,46 @@
+"""Add fee buckets
+
+Revision ID: ab5103ee7b67
+Revises: 79e4079f5b1c
+Create Date: 2026-10-18 13:40:55.102947
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ab5103ee7b67'
+down_revision: Union[str, Sequence[str], None] = '79e4079f5b1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('fee_buckets',
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('fee_sum', sa.BigInteger(), nullable=False),
+    sa.Column('fee_prefix', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('bucket')
+    )
+
+    # the buckets share the rollup watermark, so backfill everything it already covers
+    op.execute("""
+        INSERT INTO fee_buckets (bucket, fee_sum, fee_prefix)
+        SELECT bucket, fee_sum, SUM(fee_sum) OVER (ORDER BY bucket)
+        FROM (
+            SELECT date_trunc('hour', created_at, 'UTC') AS bucket, SUM(COALESCE(fee_amount, 0)) AS fee_sum
+            FROM transactions
+            WHERE created_at IS NOT NULL
+              AND id <= (SELECT last_transaction_id FROM rollup_watermarks WHERE name = 'transactions')
+            GROUP BY 1
+        ) b
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fee_buckets')
@@ -1,23 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 from typing import List
 
-from app.core.database import get_db, AsyncSession
-from app.models.domain import User, Card, Account
+from app.core.config import settings
+from app.core.database import get_read_db, AsyncSession
+from app.core.serialization import FastJSONResponse, card_rows
+from app.models.domain import Card, Account
 from app.schemas.api_schemas import CardResponse
+from app.services.balance_slots import balance_with_slots
 
 router = APIRouter()
 
 # cards data
 @router.get("/my-cards", response_model=List[CardResponse])
-async def get_my_cards(user_id: int, db: AsyncSession = Depends(get_db)):
+async def get_my_cards(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    #main balance and slots come from one snapshot, so a sharded balance is never half counted
     result = await db.execute(
-        select(Card)
-        .options(selectinload(Card.account))
+        select(Card.card_number, Account.iban, balance_with_slots().label("balance"))
+        .join(Account, Card.account_id == Account.id)
         .where(Card.user_id == user_id)
+        .order_by(Card.id)
     )
-    cards = result.scalars().all()
+    cards = result.all()
 
     if not cards:
         raise HTTPException(
@@ -25,12 +29,7 @@ async def get_my_cards(user_id: int, db: AsyncSession = Depends(get_db)):
             detail="No user was found with these details, or the user has no cards."
         )
 
-    response_data = []
-    for card in cards:
-        response_data.append(CardResponse(
-            card_number=card.card_number,
-            account_number=card.account.iban,
-            balance=card.account.balance
-        ))
-
+    response_data = card_rows(cards)
+    if settings.FAST_SERIALIZATION:
+        return FastJSONResponse(response_data)
     return response_data
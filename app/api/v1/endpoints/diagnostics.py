@@ -0,0 +1,35 @@
+from fastapi import APIRouter
+
+from app.core.database import pool_stats, pool_status, read_engine, replica_health
+from app.core.security import hash_pool_stats
+from app.services.card_directory import card_cache
+from app.services.admission import admission
+from app.services.fees import fees_cache
+from app.services.transfer_service import transfer_committer
+
+router = APIRouter()
+
+
+@router.get("/pool")
+async def get_pool_diagnostics():
+    return {
+        "database": {
+            **pool_status(),
+            "stats": pool_stats.as_dict()
+        },
+        "read_replica": {
+            **replica_health.as_dict(),
+            "pool": pool_status(read_engine) if read_engine is not None else None
+        },
+        "pin_hash": hash_pool_stats(),
+        "group_commit": transfer_committer.stats(),
+        "admission": admission.stats()
+    }
+
+
+@router.get("/caches")
+async def get_cache_diagnostics():
+    return {
+        "cards": card_cache.stats(),
+        "fees_report": fees_cache.stats()
+    }
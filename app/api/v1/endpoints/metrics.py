@@ -0,0 +1,73 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.database import engine, pool_stats, read_engine
+from app.core.metrics import register_collector, render_metrics
+from app.core.security import hash_pool_stats
+from app.services.admission import admission
+from app.services.card_directory import card_cache
+from app.services.fees import fees_cache
+from app.services.report_jobs import report_workers
+from app.services.transaction_feed import transaction_feed
+from app.services.transfer_service import transfer_committer
+
+router = APIRouter()
+
+
+def _pool_samples():
+    samples = []
+    for name, target in (("primary", engine), ("replica", read_engine)):
+        if target is None or not hasattr(target.pool, "checkedout"):
+            continue
+        pool = target.pool
+        samples.append(({"db": name, "state": "checked_out"}, pool.checkedout()))
+        samples.append(({"db": name, "state": "checked_in"}, pool.checkedin()))
+        samples.append(({"db": name, "state": "overflow"}, max(pool.overflow(), 0)))
+    return samples
+
+
+def _collect():
+    group_commit = transfer_committer.stats()
+    gate = admission.stats()
+    reports = report_workers.stats()
+    feed = transaction_feed.stats()
+    return [
+        ("db_pool_connections", "Connections per pool and state.", "gauge", _pool_samples()),
+        ("db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.", "counter", [({}, pool_stats.timeouts)]),
+        ("pin_hash_pending", "PIN hash jobs running or queued.", "gauge", [({}, hash_pool_stats()["pending"])]),
+        ("group_commit_commits_total", "Transactions committed by the transfer group committer.", "counter", [({}, group_commit["commits"])]),
+        ("group_commit_calls_total", "Transfers settled by the transfer group committer.", "counter", [({}, group_commit["calls"])]),
+        ("group_commit_queued", "Transfers waiting for the next group commit.", "gauge", [({}, group_commit["queued"])]),
+        ("admission_active", "Money-moving transactions admitted and running.", "gauge", [({}, gate["active"])]),
+        ("admission_queued", "Requests waiting for a global admission slot.", "gauge", [({}, gate["queued"])]),
+        ("admission_account_queue_depth", "Requests waiting behind another request for the same account.", "gauge", [({}, gate["account_queue_depth"])]),
+        ("admission_rejected_total", "Requests turned away by admission control.", "counter", [
+            ({"reason": "per_account"}, gate["rejected_per_account"]),
+            ({"reason": "queue_full"}, gate["rejected_queue_full"]),
+            ({"reason": "timeout"}, gate["timeouts"]),
+        ]),
+        ("report_jobs_running", "Report jobs executing in this process.", "gauge", [({}, reports["running"])]),
+        ("report_jobs_finished_total", "Report jobs finished by this process.", "counter", [
+            ({"status": "done"}, reports["completed"]),
+            ({"status": "failed"}, reports["failed"]),
+        ]),
+        ("transaction_stream_subscribers", "Open transaction SSE streams.", "gauge", [({}, feed["subscribers"])]),
+        ("transaction_stream_listen_connected", "Whether the LISTEN connection of the transaction feed is up.", "gauge", [({}, int(feed["connected"]))]),
+        ("transaction_stream_notifications_total", "Transaction notifications received.", "counter", [({}, feed["notifications"])]),
+        ("transaction_stream_dropped_total", "Streams closed because the client fell a full queue behind.", "counter", [({}, feed["dropped_slow"])]),
+        ("transaction_stream_reconnects_total", "Times the LISTEN connection was re-established.", "counter", [({}, feed["reconnects"])]),
+        ("cache_requests_total", "Cache lookups by cache and result.", "counter", [
+            ({"cache": name, "result": result}, stats[key])
+            for name, stats in (("cards", card_cache.stats()), ("fees_report", fees_cache.stats()))
+            for result, key in (("hit", "hits"), ("miss", "misses"))
+        ]),
+    ]
+
+
+register_collector(_collect)
+
+
+#prometheus text exposition format
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
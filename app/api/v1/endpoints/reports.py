@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from datetime import datetime
+
+from app.core.database import get_db, get_read_db
+from app.schemas.api_schemas import (
+    SuccessCountReportRow,
+    UserReportRow,
+    CardReportRow,
+    BalanceAtResponse,
+    ReportJobRequest,
+    ReportJobResponse,
+)
+from app.services.reports import success_counts, user_totals, card_totals
+from app.services.report_jobs import submit_job, get_job
+from app.services.balance_checkpoints import balance_at
+
+router = APIRouter()
+
+
+# successful transactions per bucket (query 1 in queries.txt)
+@router.get("/success-counts", response_model=List[SuccessCountReportRow])
+async def get_success_counts(
+    grain: Literal["hour", "day", "month"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10_000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await success_counts(db, grain, start, end, limit)
+
+
+# totals per user (query 2 in queries.txt)
+@router.get("/users", response_model=List[UserReportRow])
+async def get_user_totals(
+    grain: Literal["hour", "day", "month"] = "month",
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10_000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await user_totals(db, grain, user_id, start, end, limit)
+
+
+# totals per source card (query 3 in queries.txt)
+@router.get("/cards", response_model=List[CardReportRow])
+async def get_card_totals(
+    grain: Literal["hour", "day", "month"] = "month",
+    card_number: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10_000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await card_totals(db, grain, card_number, start, end, limit)
+
+
+# account balance at a past instant, from the nearest balance checkpoint plus the transactions in between
+@router.get("/balance-at", response_model=BalanceAtResponse)
+async def get_balance_at(
+    account_id: int,
+    at: datetime,
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await balance_at(db, account_id, at)
+
+
+# runs in the background report workers; identical parameters share one job and its result
+@router.post("/jobs", response_model=ReportJobResponse, status_code=202)
+async def create_report_job(request: ReportJobRequest, db: AsyncSession = Depends(get_db)):
+    return await submit_job(db, request.kind, request.model_dump(exclude={"kind"}))
+
+
+# jobs are read from the primary, a replica may not have seen a fresh job yet
+@router.get("/jobs/{job_id}", response_model=ReportJobResponse)
+async def get_report_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found or expired")
+    return job
@@ -1,18 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, func, and_
-from typing import List, Optional
-
-from app.core.database import get_db
-from app.schemas.api_schemas import TransferRequest, TransactionResponse, WithdrawRequest
-from app.services.transfer_service import process_transfer
-from app.models.domain import Transaction, Card, Account, TransactionType, TransactionStatus
+from sqlalchemy import select, func, and_
+from typing import List, Literal, Optional
+
+from app.core.database import get_db, get_read_db, read_sessionmaker
+from app.core.serialization import FastJSONResponse, transaction_rows
+from app.schemas.api_schemas import (
+    TransferRequest,
+    TransactionResponse,
+    WithdrawRequest,
+    BatchTransferRequest,
+    BatchTransferResponse,
+    TransactionImportReport,
+)
+from app.services.history import resolve_card_id, history_page, export_statement
+from app.services.fees import get_cached, set_cached, get_fee_total, get_fee_series
+from app.services.transfer_service import process_transfer, process_transfer_batch, process_withdraw
+from app.services.transaction_feed import transaction_feed
+from app.services.transaction_import import import_transactions
+from app.models.domain import Transaction
 from app.core.config import settings
 from datetime import datetime
 
 router = APIRouter()
 
 
+def parse_date(date_str: str, field_name: str):
+    try:
+        if date_str and len(date_str) > 6 and date_str[-6] == " ":
+            date_str = date_str[:-6] + "+" + date_str[-5:]
+        return datetime.fromisoformat(date_str)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Invalid date format for '{field_name}'. "
+                "Please use standard ISO format (e.g. 2023-01-01 12:00:00)."
+            )
+        )
+
+
 @router.post("/transfer", response_model=TransactionResponse)
 async def transfer_money(
     request: TransferRequest,
@@ -27,130 +55,160 @@ async def transfer_money(
     )
 
 
+@router.post("/transfer/batch", response_model=BatchTransferResponse)
+async def transfer_money_batch(
+    request: BatchTransferRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    return await process_transfer_batch(db, request.items)
+
+
 @router.post("/withdraw", response_model=TransactionResponse)
 async def withdraw_money(
     request: WithdrawRequest,
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(
-        select(Card, Account)
-        .join(Account)
-        .where(Card.card_number == request.card_number)
-        .with_for_update()
-    )
-    data = result.first()
-
-    if not data:
-        raise HTTPException(status_code=404, detail="Card not found")
-
-    card, account = data
-
-    if account.balance < request.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
-
-    account.balance -= request.amount
-
-    new_tx = Transaction(
-        source_card_id=card.id,
-        dest_card_id=None,
-        amount=request.amount,
-        fee_amount=0,
-        total_amount=request.amount,
-        type=TransactionType.WITHDRAW.value,
-        status=TransactionStatus.SUCCESS.value,
-        
-        ref_number=f"WD-{int(datetime.now().timestamp() * 1000000)}", 
-        
-        description="withdraw money",
-        created_at=datetime.now() 
+    return await process_withdraw(
+        db,
+        request.card_number,
+        request.amount
     )
-    db.add(new_tx)
-    await db.commit()
-
-    return {
-        "ref_number": "WD-SUCCESS",
-        "amount": request.amount,
-        "fee": 0,
-        "status": "SUCCESS",
-        "date": "2023-01-01",
-        "type": "withdraw"
-    }
 
 
 @router.get("/history/{card_number}", response_model=List[TransactionResponse])
 async def get_card_history(
     card_number: str,
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    limit: int = Query(10, ge=1, le=settings.MAX_HISTORY_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_incoming: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = (
-        select(Transaction)
-        .join(Transaction.source_card)
-        .where(Transaction.source_card.has(card_number=card_number))
-        .order_by(desc(Transaction.created_at))
-        .limit(10)
-    )
+    card_id = await resolve_card_id(db, card_number)
+    if card_id is None:
+        return []
 
-    result = await db.execute(query)
-    transactions = result.scalars().all()
+    transactions, next_cursor = await history_page(db, card_id, limit, cursor, include_incoming)
+    response_data = transaction_rows(transactions)
 
-    response = []
-    for tx in transactions:
-        response.append({
-            "ref_number": tx.ref_number or "N/A",
-            "amount": tx.amount,
-            "fee": tx.fee_amount,
-            "status": "SUCCESS" if tx.status == 1 else "FAILED",
-            "date": tx.created_at,
-            "type": "transfer" if tx.type == 2 else "withdraw"
-        })
+    # the next page is requested with ?cursor=<X-Next-Cursor>
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
 
-    return response
+    if settings.FAST_SERIALIZATION:
+        return FastJSONResponse(response_data, headers=headers)
 
+    if headers:
+        response.headers.update(headers)
+    return response_data
 
-@router.get("/fees-report")
-async def get_total_fees(
+
+#the card lookup uses its own short session: a dependency session would stay checked out (idle in
+#transaction after a cache miss) until the last chunk is sent
+@router.get("/export/{card_number}")
+async def export_card_statement(
+    card_number: str,
+    format: Literal["ndjson", "csv"] = "ndjson",
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    transaction_id: Optional[int] = None,
-    db: AsyncSession = Depends(get_db)
+    include_incoming: bool = True
 ):
-    query = select(func.sum(Transaction.fee_amount))
-    filters = []
-
-    def parse_date(date_str: str, field_name: str):
-        try:
-            if date_str and len(date_str) > 6 and date_str[-6] == " ":
-                date_str = date_str[:-6] + "+" + date_str[-5:]
-            return datetime.fromisoformat(date_str)
-        except ValueError:
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    f"Invalid date format for '{field_name}'. "
-                    "Please use standard ISO format (e.g. 2023-01-01 12:00:00)."
-                )
-            )
+    start = parse_date(start_date, "start_date") if start_date else None
+    end = parse_date(end_date, "end_date") if end_date else None
+
+    factory = await read_sessionmaker()
+    async with factory() as db:
+        card_id = await resolve_card_id(db, card_number)
+    if card_id is None:
+        raise HTTPException(status_code=404, detail="Card not found")
 
-    if transaction_id:
-        filters.append(Transaction.id == transaction_id)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_statement(card_id, start, end, include_incoming, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="statement-{card_number}.{format}"'}
+    )
 
-    if start_date:
-        filters.append(Transaction.created_at >= parse_date(start_date, "start_date"))
 
-    if end_date:
-        filters.append(Transaction.created_at <= parse_date(end_date, "end_date"))
+#partner transaction files, csv (with a header line) or ndjson, loaded while the body streams in;
+#the format comes from the query or the content type
+@router.post("/import", response_model=TransactionImportReport)
+async def import_transaction_file(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        if "csv" in content_type:
+            format = "csv"
+        elif "ndjson" in content_type or "jsonl" in content_type:
+            format = "ndjson"
+        else:
+            raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass format=csv|ndjson")
+
+    return await import_transactions(db, request.stream(), format)
+
+
+#live feed of transactions into and out of the card as server-sent events; the card lookup uses
+#its own short session so an open stream does not keep a pooled connection
+@router.get("/stream/{card_number}")
+async def stream_card_transactions(card_number: str):
+    factory = await read_sessionmaker()
+    async with factory() as db:
+        card_id = await resolve_card_id(db, card_number)
+    if card_id is None:
+        raise HTTPException(status_code=404, detail="Card not found")
 
-    if filters:
-        query = query.where(and_(*filters))
+    subscriber = transaction_feed.subscribe(card_id)
+    return StreamingResponse(
+        transaction_feed.events(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    result = await db.execute(query)
-    total_fees = result.scalar() or 0
 
-    return {
+@router.get("/fees-report")
+async def get_total_fees(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    transaction_id: Optional[int] = None,
+    granularity: Optional[Literal["hour", "day", "month"]] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    start = parse_date(start_date, "start_date") if start_date else None
+    end = parse_date(end_date, "end_date") if end_date else None
+
+    cache_key = (start, end, transaction_id, granularity)
+    cached = get_cached(cache_key, end)
+
+    if cached is not None:
+        total_fees, series = cached
+    elif transaction_id:
+        filters = [Transaction.id == transaction_id, Transaction.imported.is_(False)]
+        if start:
+            filters.append(Transaction.created_at >= start)
+        if end:
+            filters.append(Transaction.created_at <= end)
+
+        result = await db.execute(select(func.sum(Transaction.fee_amount)).where(and_(*filters)))
+        total_fees = result.scalar() or 0
+        series = None
+        set_cached(cache_key, (total_fees, series))
+    else:
+        total_fees = await get_fee_total(db, start, end)
+        series = await get_fee_series(db, start, end, granularity) if granularity else None
+        set_cached(cache_key, (total_fees, series))
+
+    response = {
         "total_fee_income": total_fees,
         "filters": {
             "transaction_id": transaction_id,
             "start_date": start_date,
             "end_date": end_date
         }
-    }
\ No newline at end of file
+    }
+    if granularity:
+        response["filters"]["granularity"] = granularity
+        response["series"] = series or []
+
+    return response
@@ -1,19 +1,115 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
 
     PROJECT_NAME: str = "Bank API"
     DATABASE_URL: str
+    #optional streaming replica for read-only endpoints
+    DATABASE_READ_URL: Optional[str] = None
+    READ_REPLICA_MAX_LAG_SECONDS: float = 5
+    READ_REPLICA_CHECK_INTERVAL_SECONDS: float = 2
+    READ_REPLICA_RETRY_SECONDS: float = 30
 
     #task limits
     DAILY_TRANSACTION_LIMIT: int = 50_000_000
+    DAILY_WITHDRAW_LIMIT: Optional[int] = None
     MIN_TRANSACTION_AMOUNT: int = 1_000
     MAX_TRANSACTION_AMOUNT: int = 50_000_000
     TRANSACTION_FEE_PERCENTAGE: float = 0.10
     MAX_TRANSACTION_FEE: int = 100_000
+    MAX_BATCH_TRANSFER_ITEMS: int = 1_000
+    MAX_HISTORY_PAGE_SIZE: int = 100
+    EXPORT_FETCH_SIZE: int = 1_000
+    #history pages and exports without a start_date reach back this far, so they prune to the recent
+    #transactions partitions; 0 = no lower bound
+    HISTORY_LOOKBACK_DAYS: int = 365
+    #history and my-cards rows are encoded straight to json (orjson when installed), skipping response_model validation
+    FAST_SERIALIZATION: bool = False
     API_KEY: str
 
+    #connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1_800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    #set when connecting through a transaction-pooling proxy (pgbouncer pool_mode=transaction)
+    DB_TRANSACTION_POOLING: bool = False
+
+    #admission control for transfers and withdrawals, 0 disables it
+    ADMISSION_MAX_CONCURRENT: int = 20
+    ADMISSION_MAX_QUEUE: int = 500
+    ADMISSION_MAX_PER_ACCOUNT: int = 32
+    ADMISSION_MAX_WAIT_MS: float = 5_000
+
+    #group commit of single transfers, 0 disables it
+    GROUP_COMMIT_WINDOW_MS: float = 0
+    GROUP_COMMIT_MAX_SIZE: int = 64
+    GROUP_COMMIT_MAX_INFLIGHT: int = 4
+
+    #row lock handling, 0 disables a timeout
+    DB_LOCK_TIMEOUT_MS: int = 2_000
+    DB_STATEMENT_TIMEOUT_MS: int = 10_000
+    DB_MAX_RETRIES: int = 3
+    DB_RETRY_BACKOFF_MS: int = 20
+
+    #reporting rollups, 0 disables the in-process refresh loop
+    ROLLUP_REFRESH_INTERVAL_SECONDS: int = 30
+    ROLLUP_GRACE_SECONDS: int = 60
+    ROLLUP_BATCH_SIZE: int = 50_000
+
+    #live transaction feed (pg_notify on commit -> one LISTEN connection per worker -> SSE);
+    #the listen url defaults to DATABASE_URL and has to bypass a transaction pooler. Off by default:
+    #a commit that notifies holds the database-wide notify queue lock, serializing all such commits
+    TRANSACTION_STREAM_ENABLED: bool = False
+    TRANSACTION_STREAM_LISTEN_URL: Optional[str] = None
+    TRANSACTION_STREAM_QUEUE_SIZE: int = 64
+    TRANSACTION_STREAM_MAX_SUBSCRIBERS: int = 10_000
+    TRANSACTION_STREAM_HEARTBEAT_SECONDS: int = 15
+
+    #partner transaction imports (POST /api/v1/transactions/import)
+    IMPORT_CHUNK_SIZE: int = 5_000
+    IMPORT_MAX_ERRORS: int = 1_000
+    IMPORT_MAX_LINE_LENGTH: int = 65_536
+
+    #background report jobs, 0 workers disables the in-process pool
+    REPORT_JOB_WORKERS: int = 2
+    REPORT_JOB_TTL_SECONDS: int = 300
+    REPORT_JOB_POLL_SECONDS: float = 2
+    REPORT_JOB_TIMEOUT_SECONDS: int = 600
+    REPORT_JOB_MAX_ATTEMPTS: int = 3
+    REPORT_JOB_MAX_ROWS: int = 100_000
+
+    #balance checkpoints every N hours (utc, aligned to the epoch), checked for every CHECK_SECONDS;
+    #0 check seconds disables the in-process job
+    BALANCE_CHECKPOINT_INTERVAL_HOURS: int = 24
+    BALANCE_CHECKPOINT_CHECK_SECONDS: int = 300
+    BALANCE_CHECKPOINT_GRACE_SECONDS: int = 60
+
+    #monthly transactions partitions, see python -m app.services.partitions
+    PARTITION_MONTHS_AHEAD: int = 3
+    PARTITION_RETENTION_MONTHS: Optional[int] = None
+    PARTITION_ARCHIVE_SCHEMA: str = "archive"
+
+    #card metadata cache (ids, account, status, expiry, pin hash)
+    CARD_CACHE_SIZE: int = 100_000
+    CARD_CACHE_TTL_SECONDS: int = 60
+
+    #fees-report result cache
+    FEES_CACHE_SIZE: int = 256
+    FEES_CACHE_TTL_SECONDS: int = 5
+
+    #ref_number generator, leased from the database at startup when unset
+    REF_WORKER_ID: Optional[int] = None
+
+    #pin hashing pool ("thread" or "process")
+    PIN_HASH_EXECUTOR: str = "thread"
+    PIN_HASH_WORKERS: int = 4
+    PIN_HASH_MAX_QUEUE: int = 256
+
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
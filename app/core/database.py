@@ -1,14 +1,248 @@
+import asyncio
+import random
+import time
+import uuid
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import SessionTransactionOrigin, sessionmaker
 from app.core.config import settings
+from app.core.metrics import db_pool_checkout_wait, instrument_engine
+
+#checkout counters shared by every instrumented pool of the process
+class PoolStats:
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.peak_checked_out = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "peak_checked_out": self.peak_checked_out,
+        }
+
+pool_stats = PoolStats()
+
+#queue pool that records how often and how long a checkout had to wait for a free connection
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+
+    def _do_get(self):
+        saturated = self.checkedin() == 0 and self._max_overflow > -1 and self._overflow >= self._max_overflow
+        start = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            if saturated:
+                waited = time.perf_counter() - start
+                pool_stats.waits += 1
+                pool_stats.wait_seconds += waited
+                pool_stats.max_wait_seconds = max(pool_stats.max_wait_seconds, waited)
+
+        db_pool_checkout_wait.observe(time.perf_counter() - start)
+        pool_stats.checkouts += 1
+        pool_stats.peak_checked_out = max(pool_stats.peak_checked_out, self.checkedout())
+        return entry
 
-engine = create_async_engine(settings.DATABASE_URL, future=True, echo=False)
+    def _create_connection(self):
+        pool_stats.connects += 1
+        return super()._create_connection()
+
+def engine_options() -> dict:
+    options = {
+        "future": True,
+        "echo": False,
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+    }
+    if settings.DB_TRANSACTION_POOLING:
+        #server connections change between transactions, so named prepared statements
+        #must not be cached or reused across them
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+#session on the replica that survives it going away mid-request: a statement that fails on the
+#replica connection marks it down and runs again on the primary, which the session keeps using.
+#explicit transactions are not moved over, their earlier statements ran on the replica
+class ReplicaSession(AsyncSession):
+
+    async def execute(self, statement, *args, **kwargs):
+        try:
+            return await super().execute(statement, *args, **kwargs)
+        except (OSError, OperationalError, InterfaceError):
+            transaction = self.sync_session.get_transaction()
+            if self.bind is not read_engine or (transaction is not None and transaction.origin is not SessionTransactionOrigin.AUTOBEGIN):
+                raise
+            replica_health.mark_down()
+            replica_health.fallbacks += 1
+            await self.close()
+            self.bind = engine
+            self.sync_session.bind = engine.sync_engine
+        return await super().execute(statement, *args, **kwargs)
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_options())
 AsyncSessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+read_engine = create_async_engine(settings.DATABASE_READ_URL, **engine_options()) if settings.DATABASE_READ_URL else None
+ReadSessionLocal = sessionmaker(read_engine, expire_on_commit=False, class_=ReplicaSession) if read_engine else None
+
+instrument_engine(engine.sync_engine, "primary")
+if read_engine is not None:
+    instrument_engine(read_engine.sync_engine, "replica")
+
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+#cached replica lag check, the replica is skipped while it lags or after it failed
+class ReplicaHealth:
+
+    def __init__(self):
+        self.checked_at = 0.0
+        self.usable = False
+        self.lag_seconds = None
+        self.down_until = 0.0
+        self.failures = 0
+        self.fallbacks = 0
+
+    def mark_down(self):
+        self.failures += 1
+        self.usable = False
+        self.down_until = time.monotonic() + settings.READ_REPLICA_RETRY_SECONDS
+
+    async def is_usable(self) -> bool:
+        now = time.monotonic()
+        if now < self.down_until:
+            return False
+        if now - self.checked_at < settings.READ_REPLICA_CHECK_INTERVAL_SECONDS:
+            return self.usable
+
+        #concurrent callers keep using the previous answer while this check runs
+        self.checked_at = now
+        try:
+            async with read_engine.connect() as conn:
+                self.lag_seconds = float((await conn.execute(REPLICA_LAG_SQL)).scalar())
+        except (OSError, DBAPIError, TimeoutError):
+            self.mark_down()
+            return False
+
+        self.usable = self.lag_seconds <= settings.READ_REPLICA_MAX_LAG_SECONDS
+        return self.usable
+
+    def as_dict(self) -> dict:
+        return {
+            "configured": read_engine is not None,
+            "usable": self.usable,
+            "lag_seconds": self.lag_seconds,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+        }
+
+replica_health = ReplicaHealth()
+
+#deadlock, serialization failure, lock_timeout expired
+RETRYABLE_SQLSTATES = {"40P01", "40001", "55P03"}
+
 #async connection with db
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+#session factory for read-only work: the replica when it is healthy and fresh enough, else the primary
+async def read_sessionmaker():
+    if read_engine is not None:
+        if await replica_health.is_usable():
+            return ReadSessionLocal
+        replica_health.fallbacks += 1
+    return AsyncSessionLocal
+
+#replica statements that fail on the connection are retried on the primary by ReplicaSession
+async def get_read_db():
+    factory = await read_sessionmaker()
+    async with factory() as session:
+        try:
+            yield session
+        except (OSError, OperationalError, InterfaceError):
+            if session.bind is read_engine:
+                replica_health.mark_down()
+            raise
+        finally:
+            await session.close()
+
+def is_retryable(exc: DBAPIError) -> bool:
+    orig = exc.orig
+    code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return code in RETRYABLE_SQLSTATES
+
+async def apply_timeouts(db: AsyncSession):
+    if not settings.DB_LOCK_TIMEOUT_MS and not settings.DB_STATEMENT_TIMEOUT_MS:
+        return
+    #set_config(..., true) only lasts until the end of the current transaction
+    await db.execute(
+        select(
+            func.set_config("lock_timeout", f"{settings.DB_LOCK_TIMEOUT_MS}ms", True),
+            func.set_config("statement_timeout", f"{settings.DB_STATEMENT_TIMEOUT_MS}ms", True)
+        )
+    )
+
+#runs work(db, *args) in its own transaction, retrying deadlocks and lock timeouts
+async def run_in_transaction(db: AsyncSession, work, *args):
+    attempt = 0
+    while True:
+        try:
+            async with db.begin():
+                await apply_timeouts(db)
+                return await work(db, *args)
+        except DBAPIError as exc:
+            if attempt >= settings.DB_MAX_RETRIES or not is_retryable(exc):
+                raise
+            attempt += 1
+            backoff = settings.DB_RETRY_BACKOFF_MS * (2 ** attempt) / 1000
+            await asyncio.sleep(random.uniform(0, backoff))
+
+def pool_status(target=engine) -> dict:
+    pool = target.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    return status
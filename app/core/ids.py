@@ -0,0 +1,143 @@
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+#2025-01-01T00:00:00Z, 41 bits of milliseconds last until 2094
+EPOCH_MS = 1_735_689_600_000
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+#crockford base32 is in ascending ascii order, so fixed width keys sort like the integers
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ENCODED_WIDTH = 13
+
+#advisory lock namespace used to lease worker ids ("REF")
+LEASE_NAMESPACE = 0x524546
+
+
+def encode_id(value: int) -> str:
+    chars = []
+    for _ in range(ENCODED_WIDTH):
+        value, rest = divmod(value, 32)
+        chars.append(ALPHABET[rest])
+    return "".join(reversed(chars))
+
+
+#time | worker | sequence ids, strictly increasing within one generator
+class SnowflakeGenerator:
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self) -> int:
+        return self._worker_id
+
+    @worker_id.setter
+    def worker_id(self, value: int):
+        if not 0 <= value <= MAX_WORKER_ID:
+            raise ValueError(f"worker id must be between 0 and {MAX_WORKER_ID}")
+        self._worker_id = value
+
+    def next_id(self) -> int:
+        with self._lock:
+            now = int(time.time() * 1000)
+            #a clock that went backwards keeps using the last millisecond instead of blocking
+            if now <= self._last_ms:
+                self._sequence = (self._sequence + 1) & SEQUENCE_MASK
+                if self._sequence == 0:
+                    self._last_ms += 1
+            else:
+                self._last_ms = now
+                self._sequence = 0
+
+            return ((self._last_ms - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)) | (self._worker_id << SEQUENCE_BITS) | self._sequence
+
+
+def fallback_worker_id() -> int:
+    return zlib.crc32(f"{socket.gethostname()}:{os.getpid()}".encode()) & MAX_WORKER_ID
+
+
+generator = SnowflakeGenerator(settings.REF_WORKER_ID if settings.REF_WORKER_ID is not None else fallback_worker_id())
+
+
+def next_ref(prefix: str) -> str:
+    return f"{prefix}-{encode_id(generator.next_id())}"
+
+
+#holds a session advisory lock on one worker id for the lifetime of the process,
+#so every uvicorn worker on every host sharing the database gets a distinct id
+class WorkerIdLease:
+
+    def __init__(self):
+        self._engine = None
+        self._conn = None
+        self.worker_id: Optional[int] = None
+
+    async def acquire(self) -> Optional[int]:
+        self._engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+        self._conn = await self._engine.connect()
+        result = await self._conn.execute(
+            text("""
+                SELECT id FROM generate_series(0, CAST(:max_id AS integer)) AS id
+                WHERE pg_try_advisory_lock(CAST(:namespace AS integer), id)
+                LIMIT 1
+            """),
+            {"max_id": MAX_WORKER_ID, "namespace": LEASE_NAMESPACE}
+        )
+        self.worker_id = result.scalar()
+        await self._conn.commit()
+        return self.worker_id
+
+    async def release(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+lease = WorkerIdLease()
+
+
+async def start_ref_generator():
+    if settings.REF_WORKER_ID is not None:
+        return
+    if settings.DB_TRANSACTION_POOLING:
+        #session advisory locks do not survive a transaction pooler, set REF_WORKER_ID per process instead
+        logger.warning("REF_WORKER_ID is not set behind a transaction pooler, using %s", generator.worker_id)
+        return
+    try:
+        worker_id = await lease.acquire()
+    except Exception:
+        logger.warning("could not lease a ref worker id, using %s", generator.worker_id, exc_info=True)
+        await lease.release()
+        return
+
+    if worker_id is None:
+        logger.warning("all ref worker ids are leased, using %s", generator.worker_id)
+        await lease.release()
+        return
+    generator.worker_id = worker_id
+
+
+async def stop_ref_generator():
+    await lease.release()
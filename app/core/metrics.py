@@ -0,0 +1,223 @@
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import event
+
+#seconds, from fast index lookups up to the pool timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: list = []
+_collectors: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+#prometheus histogram with fixed buckets; series are keyed by the label values tuple.
+#not thread safe, every observation happens on the event loop thread
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            #per-bucket counts (+Inf last), sum, count
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+#point-in-time values (pool sizes, queue depths) are read at scrape time: fn() -> [(name, help, type, [(labels dict, value)])]
+def register_collector(fn: Callable[[], List[Tuple[str, str, str, list]]]):
+    _collectors.append(fn)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, documentation, kind, samples in collect():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by method, route template and status code.",
+    ("method", "route", "status")
+)
+db_statement_duration = Histogram(
+    "db_statement_duration_seconds",
+    "Statement execution time by database, statement kind and first table.",
+    ("db", "statement")
+)
+db_row_lock_wait = Histogram(
+    "db_row_lock_wait_seconds",
+    "Duration of statements that take row locks (SELECT ... FOR UPDATE, UPDATE), an upper bound of row lock waits.",
+    ("db", "statement")
+)
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent getting a connection from the pool."
+)
+pin_verify_duration = Histogram(
+    "pin_verify_duration_seconds",
+    "PIN verification time including the wait for a hash pool worker."
+)
+daily_spend_duration = Histogram(
+    "daily_spend_duration_seconds",
+    "Daily limit counter statements by operation.",
+    ("operation",)
+)
+
+admission_wait = Histogram(
+    "admission_wait_seconds",
+    "Time a money-moving request waited for its account and a global admission slot."
+)
+
+_STATEMENT_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+([A-Za-z_][A-Za-z0-9_.]*)", re.IGNORECASE)
+_statement_labels: Dict[str, Tuple[str, bool]] = {}
+MAX_STATEMENT_LABELS = 2_000
+
+
+#"SELECT cards", "UPDATE accounts", ... plus whether the statement takes row locks;
+#the sql text itself would make the label set unbounded
+def statement_label(statement: str) -> Tuple[str, bool]:
+    cached = _statement_labels.get(statement)
+    if cached is not None:
+        return cached
+
+    words = statement.split(None, 1)
+    verb = words[0].upper() if words else "?"
+    match = _STATEMENT_TABLE.search(statement)
+    label = f"{verb} {match.group(1)}" if match else verb
+    locking = verb == "UPDATE" or "FOR UPDATE" in statement or "FOR SHARE" in statement
+
+    #expanded IN lists produce many statement strings for the same label
+    if len(_statement_labels) < MAX_STATEMENT_LABELS:
+        _statement_labels[statement] = (label, locking)
+    return label, locking
+
+
+def instrument_engine(sync_engine, db: str):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _observe(conn, statement):
+        started = conn.info["metrics_started"].pop()
+        elapsed = time.perf_counter() - started
+        label, locking = statement_label(statement)
+        db_statement_duration.observe(elapsed, db, label)
+        if locking:
+            db_row_lock_wait.observe(elapsed, db, label)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        _observe(conn, statement)
+
+    #a statement that raised (lock timeout, deadlock) never reaches after_cursor_execute
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(context):
+        conn = context.connection
+        if conn is not None and context.statement and conn.info.get("metrics_started"):
+            _observe(conn, context.statement)
+
+
+#pure asgi middleware (no BaseHTTPMiddleware task per request), routes are labelled
+#by template so path parameters do not become labels
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route_template(scope), str(status))
+
+
+#"/api/v1/transactions/history/{card_number}" for "/api/v1/transactions/history/6037..."; the
+#matched route object only knows its path relative to its router, so the template is rebuilt
+#from the request path and the path parameters
+def route_template(scope) -> str:
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    params = scope.get("path_params")
+    if not params:
+        return path
+    names = {str(value): name for name, value in params.items()}
+    return "/".join("{" + names[part] + "}" if part in names else part for part in path.split("/"))
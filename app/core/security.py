@@ -1,10 +1,70 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
+from app.core.config import settings
+from app.core.metrics import pin_verify_duration
+
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_executor: Optional[Executor] = None
+_pending = 0
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+#bcrypt is cpu bound, run it on a worker pool so the event loop keeps serving requests
+def get_hash_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if settings.PIN_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=settings.PIN_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PIN_HASH_WORKERS,
+                thread_name_prefix="pin-hash"
+            )
+    return _executor
+
+def shutdown_hash_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def _run_on_pool(func, *args):
+    global _pending
+    #running + queued jobs, reject instead of letting the backlog grow unbounded
+    if _pending >= settings.PIN_HASH_WORKERS + settings.PIN_HASH_MAX_QUEUE:
+        raise HTTPException(status_code=503, detail="PIN verification is busy, please try again")
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: Optional[str]) -> bool:
+    if not hashed_password:
+        return False
+    with pin_verify_duration.time():
+        return await _run_on_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_on_pool(get_password_hash, password)
+
+def hash_pool_stats() -> dict:
+    return {
+        "executor": settings.PIN_HASH_EXECUTOR,
+        "workers": settings.PIN_HASH_WORKERS,
+        "max_queue": settings.PIN_HASH_MAX_QUEUE,
+        "pending": _pending
+    }
@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+from typing import Any, Iterable
+
+from fastapi.responses import Response
+
+from app.models.domain import TransactionStatus, TransactionType
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used instead
+    orjson = None
+
+#api labels indexed by the smallint stored in the row
+STATUS_LABELS = {
+    status.value: "SUCCESS" if status == TransactionStatus.SUCCESS else "FAILED"
+    for status in TransactionStatus
+}
+TYPE_LABELS = {
+    TransactionType.CARD_TO_CARD.value: "transfer",
+    TransactionType.WITHDRAW.value: "withdraw",
+}
+
+
+def status_label(status) -> str:
+    return STATUS_LABELS.get(status, "FAILED")
+
+
+def type_label(tx_type) -> str:
+    return TYPE_LABELS.get(tx_type, "withdraw")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+#already shaped like the response_model, so it goes out without pydantic validation
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+#rows with id/ref_number/amount/fee_amount/status/type/created_at -> TransactionResponse shape
+def transaction_rows(rows: Iterable) -> list:
+    statuses = STATUS_LABELS
+    types = TYPE_LABELS
+    return [
+        {
+            "ref_number": row.ref_number or "N/A",
+            "amount": row.amount,
+            "fee": row.fee_amount or 0,
+            "status": statuses.get(row.status, "FAILED"),
+            "date": row.created_at,
+            "type": types.get(row.type, "withdraw"),
+        }
+        for row in rows
+    ]
+
+
+#rows with card_number/iban/balance -> CardResponse shape (by alias)
+def card_rows(rows: Iterable) -> list:
+    return [
+        {"card_number": row.card_number, "account_number": row.iban, "balance": row.balance}
+        for row in rows
+    ]
@@ -1,7 +1,17 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI,HTTPException, Security, Depends
 from fastapi.security.api_key import APIKeyHeader
 from app.core.config import settings
-from app.api.v1.endpoints import cards, transactions
+from app.core.security import shutdown_hash_executor
+from app.core.ids import start_ref_generator, stop_ref_generator
+from app.core.metrics import MetricsMiddleware
+from app.services.rollups import rollup_refresh_loop
+from app.services.balance_checkpoints import balance_checkpoint_loop
+from app.services.transfer_service import transfer_committer
+from app.services.report_jobs import report_workers
+from app.services.transaction_feed import transaction_feed
+from app.api.v1.endpoints import cards, transactions, reports, diagnostics, metrics
 
 #api key
 API_KEY_NAME = "x-api-key"
@@ -14,15 +24,50 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
         )
     return api_key_header
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_ref_generator()
+
+    if settings.GROUP_COMMIT_WINDOW_MS > 0:
+        transfer_committer.start()
+
+    if settings.REPORT_JOB_WORKERS > 0:
+        report_workers.start()
+    if settings.TRANSACTION_STREAM_ENABLED:
+        transaction_feed.start()
+
+    tasks = []
+    if settings.ROLLUP_REFRESH_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(rollup_refresh_loop()))
+    if settings.BALANCE_CHECKPOINT_CHECK_SECONDS > 0:
+        tasks.append(asyncio.create_task(balance_checkpoint_loop()))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await transfer_committer.stop()
+    await report_workers.stop()
+    await transaction_feed.stop()
+    shutdown_hash_executor()
+    await stop_ref_generator()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="Bank API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+app.add_middleware(MetricsMiddleware)
+
 #roots
 app.include_router(cards.router, prefix="/api/v1/cards", tags=["Cards"], dependencies=[Depends(get_api_key)])
 app.include_router(transactions.router,prefix="/api/v1/transactions",tags=["Transactions"],dependencies=[Depends(get_api_key)])
+app.include_router(reports.router, prefix="/api/v1/reports", tags=["Reports"], dependencies=[Depends(get_api_key)])
+app.include_router(diagnostics.router, prefix="/api/v1/diagnostics", tags=["Diagnostics"], dependencies=[Depends(get_api_key)])
+app.include_router(metrics.router, prefix="/metrics", tags=["Diagnostics"], dependencies=[Depends(get_api_key)])
 
 @app.get("/")
 async def root():
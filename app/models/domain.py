@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, DateTime, Text, SmallInteger, Index
+from sqlalchemy import Column, Integer, String, BigInteger, Boolean, ForeignKey, DateTime, Date, Text, SmallInteger, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 import enum
@@ -19,6 +20,22 @@ class EntityStatus(int, enum.Enum):
     ACTIVE = 1
     BLOCKED = 0
 
+class RollupScope(int, enum.Enum):
+    GLOBAL = 0
+    CARD = 1
+    USER = 2
+
+class RollupGrain(int, enum.Enum):
+    HOUR = 1
+    DAY = 2
+    MONTH = 3
+
+class ReportJobStatus(int, enum.Enum):
+    PENDING = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
 class User(Base):
     __tablename__ = "users"
 
@@ -38,6 +55,8 @@ class Account(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     iban = Column(String, unique=True, nullable=True)
     balance = Column(BigInteger, default=0, nullable=False)
+    #0 = plain balance, N = credits are spread over N rows in account_balance_slots
+    balance_slots = Column(SmallInteger, default=0, nullable=False)
     status = Column(SmallInteger, default=EntityStatus.ACTIVE.value)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -75,10 +94,14 @@ class Card(Base):
         back_populates="dest_card"
     )
 
+#range partitioned by month on created_at (see app/services/partitions.py), so created_at
+#is part of the primary key and of the ref_number unique index. That index only rejects a repeated
+#(ref_number, created_at); refs are globally unique because every writer makes them so: next_ref()
+#for live transactions, a NOT EXISTS check under an advisory lock for imports, SEED-... in the seeder
 class Transaction(Base):
     __tablename__ = "transactions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     
     source_card_id = Column(Integer, ForeignKey("cards.id"), nullable=True)
     dest_card_id = Column(Integer, ForeignKey("cards.id"), nullable=True)
@@ -90,10 +113,12 @@ class Transaction(Base):
     type = Column(SmallInteger, nullable=False)
     status = Column(SmallInteger, default=TransactionStatus.PENDING.value)
     
-    ref_number = Column(String, unique=True, index=True, nullable=True)
+    ref_number = Column(String, nullable=True)
     description = Column(Text, nullable=True)
+    #loaded from a partner file (POST /transactions/import): history only, no balance ever moved for it
+    imported = Column(Boolean, server_default=text("false"), nullable=False)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
 
     source_card = relationship(
@@ -112,4 +137,90 @@ class Transaction(Base):
         Index('idx_dest_created', 'dest_card_id', 'created_at'),
         Index('idx_status_created', 'status', 'created_at'),
         Index('idx_created_at', 'created_at'),
+        Index('uq_transactions_ref_created', 'ref_number', 'created_at', unique=True),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+#sub-balances of a hot account, the real balance is accounts.balance + SUM(balance) of its slots
+class AccountBalanceSlot(Base):
+    __tablename__ = "account_balance_slots"
+
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    slot = Column(SmallInteger, primary_key=True)
+    balance = Column(BigInteger, default=0, nullable=False)
+
+#balance of an account (main row + slots) after every transaction created before checkpoint_at,
+#written by the checkpoint job (app/services/balance_checkpoints.py)
+class AccountBalanceCheckpoint(Base):
+    __tablename__ = "account_balance_checkpoints"
+
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    checkpoint_at = Column(DateTime(timezone=True), primary_key=True)
+    balance = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index('idx_balance_checkpoints_at', 'checkpoint_at'),
+    )
+
+#running per-card totals for the daily limits, kept in the same db transaction as the transfer
+class CardDailySpend(Base):
+    __tablename__ = "card_daily_spend"
+
+    card_id = Column(Integer, ForeignKey("cards.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    transfer_amount = Column(BigInteger, default=0, nullable=False)
+    withdraw_amount = Column(BigInteger, default=0, nullable=False)
+
+#pre-aggregated successful transactions, scope_id is the card/user id (0 for global)
+class TransactionRollup(Base):
+    __tablename__ = "transaction_rollups"
+
+    scope = Column(SmallInteger, primary_key=True)
+    grain = Column(SmallInteger, primary_key=True)
+    scope_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+
+    tx_count = Column(BigInteger, default=0, nullable=False)
+    amount_sum = Column(BigInteger, default=0, nullable=False)
+    fee_sum = Column(BigInteger, default=0, nullable=False)
+
+#last transaction id folded into the rollups by the refresh job
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String, primary_key=True)
+    last_transaction_id = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+#hourly (utc) fee totals with a running prefix sum, maintained by the rollup refresh job
+class FeeBucket(Base):
+    __tablename__ = "fee_buckets"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    fee_sum = Column(BigInteger, default=0, nullable=False)
+    fee_prefix = Column(BigInteger, default=0, nullable=False)
+
+#background report runs; params_key hashes the kind and its normalized parameters, so identical
+#requests share one live (pending/running) job and reuse its result until expires_at
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String, nullable=False)
+    params_key = Column(String(64), nullable=False)
+    params = Column(JSONB, nullable=False)
+    status = Column(SmallInteger, default=ReportJobStatus.PENDING.value, nullable=False)
+    attempts = Column(SmallInteger, default=0, nullable=False)
+    result = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('uq_report_jobs_live_key', 'params_key', unique=True, postgresql_where=text('status IN (0, 1)')),
+        Index('idx_report_jobs_key_expires', 'params_key', 'expires_at'),
+        Index('idx_report_jobs_status_created', 'status', 'created_at'),
     )
@@ -1,9 +1,21 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+from datetime import datetime, timezone
 from app.core.config import settings
 
 
+def validate_transfer_amount(v: int) -> int:
+    if v < settings.MIN_TRANSACTION_AMOUNT:
+        raise ValueError(
+            f"Minimum transaction amount is {settings.MIN_TRANSACTION_AMOUNT} tomans"
+        )
+    if v > settings.MAX_TRANSACTION_AMOUNT:
+        raise ValueError(
+            f"Maximum transaction amount is {settings.MAX_TRANSACTION_AMOUNT} tomans"
+        )
+    return v
+
+
 class CardResponse(BaseModel):
     card_number: str
     iban: str = Field(..., alias="account_number")
@@ -33,15 +45,7 @@ class TransferRequest(BaseModel):
 
     @validator("amount")
     def validate_amount(cls, v):
-        if v < settings.MIN_TRANSACTION_AMOUNT:
-            raise ValueError(
-                f"Minimum transaction amount is {settings.MIN_TRANSACTION_AMOUNT} tomans"
-            )
-        if v > settings.MAX_TRANSACTION_AMOUNT:
-            raise ValueError(
-                f"Maximum transaction amount is {settings.MAX_TRANSACTION_AMOUNT} tomans"
-            )
-        return v
+        return validate_transfer_amount(v)
 
 
 class WithdrawRequest(BaseModel):
@@ -54,3 +58,125 @@ class WithdrawRequest(BaseModel):
         if v < settings.MIN_TRANSACTION_AMOUNT:
             raise ValueError("Amount is below the allowed minimum")
         return v
+
+
+#amount limits of batch items are checked per item so one bad item does not reject the batch
+class BatchTransferItem(BaseModel):
+    source_card_number: str = Field(..., min_length=16, max_length=16)
+    dest_card_number: str = Field(..., min_length=16, max_length=16)
+    amount: int
+    pin: str
+
+
+class BatchTransferRequest(BaseModel):
+    items: List[BatchTransferItem] = Field(..., min_length=1, max_length=settings.MAX_BATCH_TRANSFER_ITEMS)
+
+
+class BatchTransferItemResult(BaseModel):
+    index: int
+    status: str
+    amount: int
+    fee: int = 0
+    ref_number: Optional[str] = None
+    date: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class BatchTransferResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchTransferItemResult]
+
+
+#largest value of a bigint column
+BIGINT_MAX = 2**63 - 1
+
+
+#one line of a partner import file, card numbers are resolved to card ids by the importer
+class TransactionImportRow(BaseModel):
+    ref_number: str = Field(..., min_length=1, max_length=64)
+    source_card_number: Optional[str] = Field(None, min_length=16, max_length=16)
+    dest_card_number: Optional[str] = Field(None, min_length=16, max_length=16)
+    amount: int = Field(..., gt=0, le=BIGINT_MAX)
+    fee: int = Field(0, ge=0, le=BIGINT_MAX)
+    type: Literal["transfer", "withdraw"]
+    status: Literal["SUCCESS", "FAILED"] = "SUCCESS"
+    date: datetime
+    description: Optional[str] = None
+
+    #files without an offset are in utc
+    @validator("date")
+    def validate_date(cls, v):
+        return v if v.tzinfo else v.replace(tzinfo=timezone.utc)
+
+    #postgres text cannot hold NUL, COPY would fail the whole chunk on it
+    @validator("ref_number", "source_card_number", "dest_card_number", "description")
+    def validate_no_nul(cls, v):
+        if v is not None and "\x00" in v:
+            raise ValueError("must not contain NUL characters")
+        return v
+
+
+class TransactionImportError(BaseModel):
+    line: int
+    error: str
+
+
+class TransactionImportReport(BaseModel):
+    rows: int
+    inserted: int
+    duplicates: int
+    failed: int
+    errors: List[TransactionImportError]
+    errors_truncated: bool
+
+
+class SuccessCountReportRow(BaseModel):
+    bucket: datetime
+    transaction_count: int
+
+
+class UserReportRow(BaseModel):
+    user_id: int
+    full_name: Optional[str] = None
+    bucket: datetime
+    total_amount: int
+    transaction_count: int
+
+
+class CardReportRow(BaseModel):
+    card_number: str
+    bucket: datetime
+    total_amount: int
+    transaction_count: int
+
+
+class BalanceAtResponse(BaseModel):
+    account_id: int
+    at: datetime
+    balance: int
+    checkpoint_at: Optional[datetime] = None
+
+
+#grain is the rollup grain, or the series granularity for "fees" (no series when unset);
+#parameters that do not apply to the kind are ignored
+class ReportJobRequest(BaseModel):
+    kind: Literal["success-counts", "users", "cards", "fees"]
+    grain: Optional[Literal["hour", "day", "month"]] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    user_id: Optional[int] = None
+    card_number: Optional[str] = Field(None, min_length=16, max_length=16)
+    limit: Optional[int] = Field(None, ge=1, le=settings.REPORT_JOB_MAX_ROWS)
+
+
+class ReportJobResponse(BaseModel):
+    id: str
+    kind: str
+    status: Literal["pending", "running", "done", "failed"]
+    params: Dict[str, Any]
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[Any] = None
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import admission_wait
+
+
+class _KeyGate:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        #holder + waiters
+        self.pending = 0
+
+
+#in-process admission in front of the money-moving transactions:
+#requests for the same account wait here one at a time instead of holding a pooled connection
+#while they queue on the row lock in postgres, then at most max_concurrent transactions run at once.
+#rejections are fast: 429 when one account has too many pending requests, 503 when the global
+#queue is full or a request waited longer than max_wait_ms
+class AdmissionController:
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_per_key: int, max_wait_ms: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_per_key = max_per_key
+        self.max_wait_ms = max_wait_ms
+
+        self._semaphore = asyncio.Semaphore(max(max_concurrent, 1))
+        self._gates: Dict[object, _KeyGate] = {}
+        self.active = 0
+        self.queued = 0
+
+        self.admitted = 0
+        self.rejected_key = 0
+        self.rejected_queue = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    @asynccontextmanager
+    async def admit(self, keys: Iterable = ()):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        deadline = start + self.max_wait_ms / 1000
+        entered = []
+        try:
+            #sorted, so two requests sharing two accounts cannot wait on each other
+            for key in sorted(set(keys)):
+                await self._enter_key(key, deadline)
+                entered.append(key)
+
+            await self._enter_global(deadline)
+            try:
+                waited = time.perf_counter() - start
+                self.admitted += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                admission_wait.observe(waited)
+                yield
+            finally:
+                self.active -= 1
+                self._semaphore.release()
+        finally:
+            for key in reversed(entered):
+                self._leave_key(key)
+
+    async def _enter_key(self, key, deadline: float):
+        gate = self._gates.get(key)
+        if gate is None:
+            gate = self._gates[key] = _KeyGate()
+        if gate.pending >= self.max_per_key:
+            self.rejected_key += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many pending requests for this account, please try again",
+                headers={"Retry-After": "1"}
+            )
+
+        gate.pending += 1
+        try:
+            await _acquire(gate.lock, deadline)
+        except asyncio.TimeoutError:
+            self._release_gate(key, gate)
+            self.timeouts += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please try again")
+        except BaseException:
+            self._release_gate(key, gate)
+            raise
+
+    def _leave_key(self, key):
+        gate = self._gates[key]
+        gate.lock.release()
+        self._release_gate(key, gate)
+
+    def _release_gate(self, key, gate: _KeyGate):
+        gate.pending -= 1
+        if gate.pending == 0:
+            del self._gates[key]
+
+    async def _enter_global(self, deadline: float):
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected_queue += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please try again", headers={"Retry-After": "1"})
+
+        self.queued += 1
+        try:
+            await _acquire(self._semaphore, deadline)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please try again")
+        finally:
+            self.queued -= 1
+        self.active += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "max_per_account": self.max_per_key,
+            "active": self.active,
+            "queued": self.queued,
+            "accounts_waiting": sum(1 for gate in self._gates.values() if gate.pending > 1),
+            "account_queue_depth": sum(gate.pending - 1 for gate in self._gates.values()),
+            "admitted": self.admitted,
+            "rejected_per_account": self.rejected_key,
+            "rejected_queue_full": self.rejected_queue,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": round(self.wait_seconds / self.admitted, 6) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+        }
+
+
+#every acquire is bounded by the deadline: a lock that was just released can still have queued
+#waiters, so locked() being False does not mean acquire() returns at once. asyncio.timeout only
+#schedules a timer handle (no wait_for task), and an uncontended acquire completes before it fires
+async def _acquire(primitive, deadline: float):
+    async with asyncio.timeout(max(deadline - time.perf_counter(), 0)):
+        await primitive.acquire()
+
+
+admission = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_per_key=settings.ADMISSION_MAX_PER_ACCOUNT,
+    max_wait_ms=settings.ADMISSION_MAX_WAIT_MS
+)
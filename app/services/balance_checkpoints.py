@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, DateTime, bindparam, cast, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.domain import Account, AccountBalanceCheckpoint, Card, Transaction, TransactionStatus
+from app.services.balance_slots import balance_with_slots
+
+logger = logging.getLogger(__name__)
+
+#advisory lock key for the checkpoint job ("BCP"), one writer at a time across processes
+CHECKPOINT_LOCK_KEY = 0x424350
+
+#balance at :at = current balance (main row + slots) minus what moved since :at, read in the one
+#snapshot of this statement so in-flight transfers count on neither side. An account gets a row
+#when it moved money since the previous checkpoint (:prev) or has no checkpoint yet; a quiet account
+#keeps its older checkpoint, which is still exact, so the delta scan after any checkpoint only
+#ever covers one interval of activity
+CHECKPOINT_SQL = text("""
+    WITH moves AS (
+        SELECT c.account_id, t.amount AS delta, t.created_at
+        FROM transactions t
+        JOIN cards c ON c.id = t.dest_card_id
+        WHERE t.status = 1 AND NOT t.imported AND t.created_at >= :prev
+        UNION ALL
+        SELECT c.account_id, -t.total_amount, t.created_at
+        FROM transactions t
+        JOIN cards c ON c.id = t.source_card_id
+        WHERE t.status = 1 AND NOT t.imported AND t.created_at >= :prev
+    ),
+    per_account AS (
+        SELECT account_id,
+               SUM(delta) FILTER (WHERE created_at >= :at) AS since,
+               bool_or(created_at < :at) AS active
+        FROM moves
+        GROUP BY account_id
+    ),
+    slots AS (
+        SELECT account_id, SUM(balance) AS total
+        FROM account_balance_slots
+        GROUP BY account_id
+    )
+    INSERT INTO account_balance_checkpoints (account_id, checkpoint_at, balance)
+    SELECT a.id, :at, a.balance + COALESCE(s.total, 0) - COALESCE(m.since, 0)
+    FROM accounts a
+    LEFT JOIN per_account m ON m.account_id = a.id
+    LEFT JOIN slots s ON s.account_id = a.id
+    WHERE m.active
+       OR NOT EXISTS (SELECT 1 FROM account_balance_checkpoints k WHERE k.account_id = a.id)
+    ON CONFLICT (account_id, checkpoint_at) DO NOTHING
+""").bindparams(bindparam("at", type_=DateTime(timezone=True)), bindparam("prev", type_=DateTime(timezone=True)))
+
+
+#latest checkpoint instant old enough that no transaction created before it is still in flight
+def due_checkpoint(now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    interval = settings.BALANCE_CHECKPOINT_INTERVAL_HOURS * 3600
+    cutoff = (now - timedelta(seconds=settings.BALANCE_CHECKPOINT_GRACE_SECONDS)).timestamp()
+    return datetime.fromtimestamp(cutoff // interval * interval, tz=timezone.utc)
+
+
+#writes the checkpoint at `at` (the due one by default), returns the number of accounts written
+#or None when another process holds the job lock
+async def write_checkpoint(db: AsyncSession, at: Optional[datetime] = None) -> Optional[int]:
+    at = at or due_checkpoint()
+    async with db.begin():
+        locked = await db.execute(select(func.pg_try_advisory_xact_lock(CHECKPOINT_LOCK_KEY)))
+        if not locked.scalar():
+            return None
+
+        result = await db.execute(
+            select(func.max(AccountBalanceCheckpoint.checkpoint_at))
+            .where(AccountBalanceCheckpoint.checkpoint_at <= at)
+        )
+        prev = result.scalar()
+        if prev == at:
+            return 0
+
+        result = await db.execute(CHECKPOINT_SQL, {"at": at, "prev": prev or at})
+        return result.rowcount
+
+
+#money into the account's cards minus money out of them, over successful transactions matching conditions.
+#imported rows never moved a balance, so they are left out here and in CHECKPOINT_SQL
+def _net_movement(account_id: int, *conditions):
+    cards = select(Card.id).where(Card.account_id == account_id)
+    credits = (
+        select(cast(func.coalesce(func.sum(Transaction.amount), 0), BigInteger))
+        .where(Transaction.dest_card_id.in_(cards), Transaction.status == TransactionStatus.SUCCESS.value, Transaction.imported.is_(False), *conditions)
+        .scalar_subquery()
+    )
+    debits = (
+        select(cast(func.coalesce(func.sum(Transaction.total_amount), 0), BigInteger))
+        .where(Transaction.source_card_id.in_(cards), Transaction.status == TransactionStatus.SUCCESS.value, Transaction.imported.is_(False), *conditions)
+        .scalar_subquery()
+    )
+    return credits - debits
+
+
+async def _checkpoint(db: AsyncSession, account_id: int, at: datetime, before: bool):
+    order = AccountBalanceCheckpoint.checkpoint_at.desc() if before else AccountBalanceCheckpoint.checkpoint_at.asc()
+    condition = AccountBalanceCheckpoint.checkpoint_at <= at if before else AccountBalanceCheckpoint.checkpoint_at > at
+    result = await db.execute(
+        select(AccountBalanceCheckpoint.checkpoint_at, AccountBalanceCheckpoint.balance)
+        .where(AccountBalanceCheckpoint.account_id == account_id, condition)
+        .order_by(order)
+        .limit(1)
+    )
+    return result.one_or_none()
+
+
+#balance after every transaction created at or before `at`: forward from the latest checkpoint
+#before it, else backward from the earliest one after it, else backward from the current balance
+async def balance_at(db: AsyncSession, account_id: int, at: datetime) -> dict:
+    created_at = Transaction.created_at
+    checkpoint = await _checkpoint(db, account_id, at, before=True)
+    if checkpoint is not None:
+        result = await db.execute(
+            select(_net_movement(account_id, created_at >= checkpoint.checkpoint_at, created_at <= at))
+        )
+        balance = checkpoint.balance + result.scalar()
+    else:
+        checkpoint = await _checkpoint(db, account_id, at, before=False)
+        if checkpoint is not None:
+            result = await db.execute(
+                select(_net_movement(account_id, created_at > at, created_at < checkpoint.checkpoint_at))
+            )
+            balance = checkpoint.balance - result.scalar()
+        else:
+            result = await db.execute(
+                select(balance_with_slots() - _net_movement(account_id, created_at > at))
+                .where(Account.id == account_id)
+            )
+            balance = result.scalar()
+            if balance is None:
+                raise HTTPException(status_code=404, detail="Account not found")
+
+    return {
+        "account_id": account_id,
+        "at": at,
+        "balance": balance,
+        "checkpoint_at": checkpoint.checkpoint_at if checkpoint is not None else None,
+    }
+
+
+async def balance_checkpoint_loop():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                written = await write_checkpoint(db)
+            if written:
+                logger.info("balance checkpoint written for %s accounts", written)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("balance checkpoint failed")
+        await asyncio.sleep(settings.BALANCE_CHECKPOINT_CHECK_SECONDS)
+
+
+async def _main(at: Optional[datetime]):
+    if at is not None and at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    async with AsyncSessionLocal() as db:
+        at = at or due_checkpoint()
+        written = await write_checkpoint(db, at)
+    if written is None:
+        print("another process is writing a checkpoint")
+    else:
+        print(f"checkpoint {at.isoformat()} written for {written} accounts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write an account balance checkpoint")
+    parser.add_argument("--at", type=datetime.fromisoformat, default=None, help="checkpoint instant, utc unless given (default: the latest due one)")
+    args = parser.parse_args()
+    asyncio.run(_main(args.at))
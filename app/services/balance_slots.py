@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, cast, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal
+from app.models.domain import Account, AccountBalanceSlot
+from app.services.card_directory import invalidate_all_cards
+from app.services.ledger import lock_accounts, sweep_slots
+
+MAX_BALANCE_SLOTS = 256
+
+
+#current balance including the slots, for read paths (no locks taken)
+def balance_with_slots():
+    slot_total = (
+        select(cast(func.coalesce(func.sum(AccountBalanceSlot.balance), 0), BigInteger))
+        .where(AccountBalanceSlot.account_id == Account.id)
+        .scalar_subquery()
+    )
+    return Account.balance + slot_total
+
+
+#switches an account to N balance slots (0 turns sharding off), the money in the slots is
+#folded into the main balance first so nothing is lost when slots go away
+async def set_balance_slots(db: AsyncSession, account_id: int, slots: int):
+    if slots < 0 or slots > MAX_BALANCE_SLOTS:
+        raise HTTPException(status_code=400, detail=f"Balance slots must be between 0 and {MAX_BALANCE_SLOTS}")
+
+    async with db.begin():
+        if account_id not in await lock_accounts(db, [account_id]):
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        #zero slots too, so no credit lands between the sweep and the delete
+        await db.execute(
+            select(AccountBalanceSlot.slot)
+            .where(AccountBalanceSlot.account_id == account_id)
+            .with_for_update()
+        )
+        balance = await sweep_slots(db, account_id)
+
+        await db.execute(
+            delete(AccountBalanceSlot)
+            .where(AccountBalanceSlot.account_id == account_id, AccountBalanceSlot.slot >= slots)
+        )
+        if slots:
+            await db.execute(
+                insert(AccountBalanceSlot)
+                .values([{"account_id": account_id, "slot": slot, "balance": 0} for slot in range(slots)])
+                .on_conflict_do_nothing()
+            )
+        await db.execute(update(Account).where(Account.id == account_id).values(balance_slots=slots))
+
+    #other workers pick the new slot count up when their card cache entries expire,
+    #until then their credits still land on a valid row
+    invalidate_all_cards()
+    return balance
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Spread credits to a hot account over several balance rows")
+    parser.add_argument("account_id", type=int)
+    parser.add_argument("slots", type=int, help="number of balance slots, 0 turns sharding off")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        balance = await set_balance_slots(db, args.account_id, args.slots)
+    print(f"account {args.account_id}: {args.slots} balance slots, balance {balance}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,112 @@
+from datetime import date
+from typing import NamedTuple, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.domain import Account, Card, EntityStatus
+
+
+#card metadata that rarely changes, balances are never cached
+class CardInfo(NamedTuple):
+    id: int
+    account_id: int
+    user_id: int
+    card_number: str
+    status: int
+    expire_month: int
+    expire_year: int
+    hashed_pin: Optional[str]
+    account_slots: int
+
+
+card_cache = TTLCache(maxsize=settings.CARD_CACHE_SIZE, ttl=settings.CARD_CACHE_TTL_SECONDS)
+
+
+async def get_cards(db: AsyncSession, card_numbers: list) -> dict:
+    found = {}
+    missing = []
+    for card_number in card_numbers:
+        info = card_cache.get(card_number)
+        if info is None:
+            missing.append(card_number)
+        else:
+            found[card_number] = info
+
+    #unknown card numbers are not cached, a new card is visible right away
+    if missing:
+        result = await db.execute(
+            select(
+                Card.id,
+                Card.account_id,
+                Card.user_id,
+                Card.card_number,
+                Card.status,
+                Card.expire_month,
+                Card.expire_year,
+                Card.hashed_pin,
+                Account.balance_slots
+            )
+            .join(Account, Card.account_id == Account.id)
+            .where(Card.card_number.in_(missing))
+        )
+        for row in result:
+            info = CardInfo(*row)
+            card_cache.set(info.card_number, info)
+            found[info.card_number] = info
+
+    return found
+
+
+async def get_card(db: AsyncSession, card_number: str) -> Optional[CardInfo]:
+    return (await get_cards(db, [card_number])).get(card_number)
+
+
+#solar hijri (year, month) of a gregorian date, the calendar card expiry dates are in
+def _jalali_year_month(day: date):
+    months = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+    gy = day.year + 1 if day.month > 2 else day.year
+    days = 355666 + 365 * day.year + (gy + 3) // 4 - (gy + 99) // 100 + (gy + 399) // 400 + day.day + months[day.month - 1]
+    year = -1595 + 33 * (days // 12053)
+    days %= 12053
+    year += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        year += (days - 1) // 365
+        days = (days - 1) % 365
+    month = 1 + days // 31 if days < 186 else 7 + (days - 186) // 30
+    return year, month
+
+
+#why the card cannot pay ("is blocked", "has expired"), None when it can; a card is valid
+#through the last day of its expiry month
+def unusable_reason(card: CardInfo, today: Optional[date] = None) -> Optional[str]:
+    if card.status != EntityStatus.ACTIVE.value:
+        return "is blocked"
+    if (card.expire_year, card.expire_month) < _jalali_year_month(today or date.today()):
+        return "has expired"
+    return None
+
+
+def invalidate_card(card_number: str):
+    card_cache.pop(card_number)
+
+
+def invalidate_all_cards():
+    card_cache.clear()
+
+
+#cards changed through the orm in this process drop out of the cache
+@event.listens_for(Card, "after_update")
+@event.listens_for(Card, "after_delete")
+def _invalidate_changed_card(mapper, connection, target):
+    if target.card_number:
+        invalidate_card(target.card_number)
+
+
+@event.listens_for(Card.card_number, "set", active_history=True)
+def _invalidate_renumbered_card(target, value, oldvalue, initiator):
+    if isinstance(oldvalue, str):
+        invalidate_card(oldvalue)
@@ -0,0 +1,87 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import daily_spend_duration
+from app.models.domain import CardDailySpend, TransactionType
+
+
+def _counter_column(tx_type: TransactionType):
+    if tx_type == TransactionType.WITHDRAW:
+        return CardDailySpend.withdraw_amount
+    return CardDailySpend.transfer_amount
+
+
+#adds amount to today's counter of the card in a single upsert,
+#returns False (and changes nothing) when the limit would be exceeded
+async def add_daily_spend(
+    db: AsyncSession,
+    card_id: int,
+    amount: int,
+    tx_type: TransactionType,
+    limit: Optional[int] = None
+) -> bool:
+    if limit is not None and amount > limit:
+        return False
+
+    column = _counter_column(tx_type)
+    table = CardDailySpend.__table__
+
+    values = {
+        "card_id": card_id,
+        "day": date.today(),
+        "transfer_amount": 0,
+        "withdraw_amount": 0,
+    }
+    values[column.key] = amount
+
+    stmt = insert(table).values(**values)
+    new_total = table.c[column.key] + stmt.excluded[column.key]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.card_id, table.c.day],
+        set_={column.key: new_total},
+        where=(new_total <= limit) if limit is not None else None
+    ).returning(table.c[column.key])
+
+    with daily_spend_duration.time("add"):
+        result = await db.execute(stmt)
+    return result.first() is not None
+
+
+#today's counters of several cards, locked until the end of the transaction
+async def get_daily_spend_for_update(db: AsyncSession, card_ids: list, tx_type: TransactionType) -> dict:
+    column = _counter_column(tx_type)
+    with daily_spend_duration.time("lock"):
+        result = await db.execute(
+            select(CardDailySpend.card_id, column)
+            .where(CardDailySpend.card_id.in_(card_ids), CardDailySpend.day == date.today())
+            .with_for_update()
+        )
+    return {row[0]: row[1] for row in result}
+
+
+#one multi-row upsert for a batch, limits must already be checked by the caller
+async def add_daily_spend_bulk(db: AsyncSession, amounts: dict, tx_type: TransactionType):
+    if not amounts:
+        return
+
+    column = _counter_column(tx_type)
+    table = CardDailySpend.__table__
+    today = date.today()
+
+    rows = []
+    for card_id, amount in amounts.items():
+        values = {"card_id": card_id, "day": today, "transfer_amount": 0, "withdraw_amount": 0}
+        values[column.key] = amount
+        rows.append(values)
+
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.card_id, table.c.day],
+        set_={column.key: table.c[column.key] + stmt.excluded[column.key]}
+    )
+    with daily_spend_duration.time("add_bulk"):
+        await db.execute(stmt)
@@ -0,0 +1,221 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.domain import FeeBucket, RollupWatermark, Transaction
+
+BUCKET = timedelta(hours=1)
+
+fees_cache = TTLCache(maxsize=settings.FEES_CACHE_SIZE, ttl=settings.FEES_CACHE_TTL_SECONDS)
+_last_fee_at = 0.0
+#earliest created_at of back-dated rows landed so far, and when the last of them landed
+_backdated_from: Optional[datetime] = None
+_backdated_at = 0.0
+
+
+#called after a commit that added fees, cached open-ended ranges older than this are dropped on read.
+#rows dated before the last bucket (an import) pass their earliest created_at, then every cached
+#range ending at or after it is dropped too
+def note_fees_landed(earliest: Optional[datetime] = None):
+    global _last_fee_at, _backdated_from, _backdated_at
+    _last_fee_at = time.monotonic()
+    if earliest is not None:
+        earliest = earliest.astimezone(timezone.utc)
+        _backdated_from = earliest if _backdated_from is None else min(_backdated_from, earliest)
+        _backdated_at = _last_fee_at
+
+
+def _stale(cached_at: float, end: Optional[datetime]) -> bool:
+    end = end.astimezone(timezone.utc) if end is not None else None
+    if cached_at < _last_fee_at and (end is None or end >= datetime.now(timezone.utc) - BUCKET):
+        return True
+    return cached_at < _backdated_at and (end is None or end >= _backdated_from)
+
+
+def get_cached(key: tuple, end: Optional[datetime]):
+    entry = fees_cache.get(key)
+    if entry is None:
+        return None
+
+    cached_at, value = entry
+    if _stale(cached_at, end):
+        fees_cache.pop(key)
+        return None
+    return value
+
+
+def set_cached(key: tuple, value):
+    fees_cache.set(key, (time.monotonic(), value))
+
+
+async def refresh_fee_buckets(db: AsyncSession, low: int, high: int):
+    result = await db.execute(
+        select(
+            func.date_trunc("hour", Transaction.created_at, "UTC").label("bucket"),
+            func.sum(func.coalesce(Transaction.fee_amount, 0)).label("fee")
+        )
+        .where(Transaction.id > low, Transaction.id <= high, Transaction.created_at.isnot(None), Transaction.imported.is_(False))
+        .group_by(text("1"))
+    )
+    deltas = [(row.bucket, row.fee) for row in result if row.fee]
+    if not deltas:
+        return
+
+    params = {"buckets": [bucket for bucket, _ in deltas], "fees": [fee for _, fee in deltas]}
+
+    #new buckets start from the prefix of the bucket before them
+    await db.execute(text("""
+        INSERT INTO fee_buckets (bucket, fee_sum, fee_prefix)
+        SELECT d.bucket, 0, COALESCE((
+            SELECT f.fee_prefix FROM fee_buckets f
+            WHERE f.bucket < d.bucket
+            ORDER BY f.bucket DESC LIMIT 1
+        ), 0)
+        FROM unnest(CAST(:buckets AS timestamptz[]), CAST(:fees AS bigint[])) AS d(bucket, fee)
+        ON CONFLICT (bucket) DO NOTHING
+    """), params)
+
+    #a delta at bucket b shifts the prefix of b and of every later bucket (normally just the newest one)
+    await db.execute(text("""
+        UPDATE fee_buckets f
+        SET fee_sum = f.fee_sum + COALESCE(own.fee, 0),
+            fee_prefix = f.fee_prefix + later.fee
+        FROM (
+            SELECT f2.bucket, SUM(d.fee) AS fee
+            FROM fee_buckets f2
+            JOIN unnest(CAST(:buckets AS timestamptz[]), CAST(:fees AS bigint[])) AS d(bucket, fee)
+              ON d.bucket <= f2.bucket
+            WHERE f2.bucket >= (SELECT MIN(b) FROM unnest(CAST(:buckets AS timestamptz[])) AS b)
+            GROUP BY f2.bucket
+        ) later
+        LEFT JOIN unnest(CAST(:buckets AS timestamptz[]), CAST(:fees AS bigint[])) AS own(bucket, fee)
+          ON own.bucket = later.bucket
+        WHERE f.bucket = later.bucket
+    """), params)
+
+
+def _hour_floor(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_ceil(value: datetime) -> datetime:
+    floor = _hour_floor(value)
+    return floor if floor == value.astimezone(timezone.utc) else floor + BUCKET
+
+
+#partner imports (transactions.imported) are not fee income, here and in the buckets
+def _fee_sum(*filters):
+    return (
+        select(func.coalesce(func.sum(Transaction.fee_amount), 0))
+        .where(Transaction.imported.is_(False), *filters)
+        .scalar_subquery()
+    )
+
+
+#running fee total of every bucket before bound (of all buckets when bound is None)
+def _prefix_before(bound: Optional[datetime]):
+    query = select(FeeBucket.fee_prefix)
+    if bound is not None:
+        query = query.where(FeeBucket.bucket < bound)
+    return func.coalesce(query.order_by(FeeBucket.bucket.desc()).limit(1).scalar_subquery(), 0)
+
+
+def _full_buckets_sum(full_start: Optional[datetime], full_end: Optional[datetime]):
+    if full_start is None:
+        return _prefix_before(full_end)
+    return _prefix_before(full_end) - _prefix_before(full_start)
+
+
+def _split_range(start: Optional[datetime], end: Optional[datetime]):
+    #whole buckets are [full_start, full_end), everything else in [start, end] is scanned directly
+    full_start = _hour_ceil(start) if start else None
+    full_end = _hour_floor(end) if end else None
+    if full_start and full_end and full_start >= full_end:
+        return None, None
+    return full_start, full_end
+
+
+def _raw_filters(start, end, full_start, full_end, watermark):
+    edges = []
+    if full_start is None and full_end is None and (start or end):
+        #range inside a single bucket
+        bounds = []
+        if start:
+            bounds.append(Transaction.created_at >= start)
+        if end:
+            bounds.append(Transaction.created_at <= end)
+        return [and_(*bounds)]
+
+    if start:
+        edges.append(and_(Transaction.created_at >= start, Transaction.created_at < full_start))
+    if end:
+        edges.append(and_(Transaction.created_at >= full_end, Transaction.created_at <= end))
+
+    #rows the refresh job has not folded into the buckets yet
+    tail = [Transaction.id > watermark]
+    if full_start:
+        tail.append(Transaction.created_at >= full_start)
+    if full_end:
+        tail.append(Transaction.created_at < full_end)
+    edges.append(and_(*tail))
+    return edges
+
+
+def _watermark():
+    return func.coalesce(
+        select(RollupWatermark.last_transaction_id)
+        .where(RollupWatermark.name == "transactions")
+        .scalar_subquery(),
+        0
+    )
+
+
+#total fees in [start, end] as prefix(full_end) - prefix(full_start) plus the partial edges, in one query
+async def get_fee_total(db: AsyncSession, start: Optional[datetime], end: Optional[datetime]) -> int:
+    full_start, full_end = _split_range(start, end)
+    watermark = _watermark()
+
+    parts = [_fee_sum(condition) for condition in _raw_filters(start, end, full_start, full_end, watermark)]
+    if full_start or full_end or not (start or end):
+        parts.append(_full_buckets_sum(full_start, full_end))
+
+    result = await db.execute(select(*parts))
+    return int(sum(result.one()))
+
+
+#fee time series: whole buckets come from fee_buckets, edges and the unfolded tail from transactions
+async def get_fee_series(db: AsyncSession, start: Optional[datetime], end: Optional[datetime], granularity: str) -> list:
+    full_start, full_end = _split_range(start, end)
+    watermark = _watermark()
+    series = {}
+
+    if full_start or full_end or not (start or end):
+        period = func.date_trunc(granularity, FeeBucket.bucket, "UTC")
+        query = select(period.label("period"), func.sum(FeeBucket.fee_sum).label("fee"))
+        if full_start:
+            query = query.where(FeeBucket.bucket >= full_start)
+        if full_end:
+            query = query.where(FeeBucket.bucket < full_end)
+        for row in await db.execute(query.group_by(text("1"))):
+            series[row.period] = series.get(row.period, 0) + row.fee
+
+    period = func.date_trunc(granularity, Transaction.created_at, "UTC")
+    for condition in _raw_filters(start, end, full_start, full_end, watermark):
+        result = await db.execute(
+            select(period.label("period"), func.sum(Transaction.fee_amount).label("fee"))
+            .where(condition, Transaction.created_at.isnot(None), Transaction.imported.is_(False))
+            .group_by(text("1"))
+        )
+        for row in result:
+            if row.fee:
+                series[row.period] = series.get(row.period, 0) + row.fee
+
+    return [
+        {"bucket": period, "fee": int(fee)}
+        for period, fee in sorted(series.items())
+    ]
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending(NamedTuple):
+    args: tuple
+    future: asyncio.Future
+
+
+#collects calls that arrive within window_ms and runs up to max_size of them in one db
+#transaction, so they share a single commit (and WAL flush).
+#apply_batch(db, [args, ...]) returns one result or exception per call; when the batch as a
+#whole fails, every call is retried in its own transaction with apply_one(db, *args)
+class GroupCommitter:
+
+    def __init__(
+        self,
+        apply_batch,
+        apply_one,
+        window_ms: Optional[float] = None,
+        max_size: Optional[int] = None,
+        max_inflight: Optional[int] = None
+    ):
+        self.apply_batch = apply_batch
+        self.apply_one = apply_one
+        self.window_ms = settings.GROUP_COMMIT_WINDOW_MS if window_ms is None else window_ms
+        self.max_size = max_size or settings.GROUP_COMMIT_MAX_SIZE
+        self.max_inflight = max_inflight or settings.GROUP_COMMIT_MAX_INFLIGHT
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collecting = []
+        self._inflight = set()
+
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self._runner = asyncio.create_task(self._run())
+
+    #commits whatever is still queued before returning
+    async def stop(self):
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        await asyncio.gather(self._runner, return_exceptions=True)
+        self._runner = None
+
+        leftover, self._collecting = self._collecting, []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        for start in range(0, len(leftover), self.max_size):
+            await self._commit(leftover[start:start + self.max_size])
+
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def submit(self, *args):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Pending(args, future))
+        return await future
+
+    async def _collect(self) -> list:
+        self._collecting = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window_ms / 1000
+
+        while len(self._collecting) < self.max_size:
+            if not self._queue.empty():
+                self._collecting.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                self._collecting.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return self._collecting
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            await self._slots.acquire()
+            #until handed to a task the batch stays in _collecting, so stop() can still commit it
+            self._collecting = []
+            task = asyncio.create_task(self._commit(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._inflight.discard(task)
+        self._slots.release()
+
+    async def _commit(self, batch: list):
+        try:
+            async with AsyncSessionLocal() as db:
+                outcomes = await run_in_transaction(db, self.apply_batch, [pending.args for pending in batch])
+        except Exception:
+            logger.warning("group commit of %s calls failed, applying them one by one", len(batch), exc_info=True)
+            self.fallbacks += 1
+            await self._commit_each(batch)
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        for pending, outcome in zip(batch, outcomes):
+            _resolve(pending.future, outcome)
+
+    async def _commit_each(self, batch: list):
+        for pending in batch:
+            try:
+                async with AsyncSessionLocal() as db:
+                    outcome = await run_in_transaction(db, self.apply_one, *pending.args)
+            except Exception as exc:
+                outcome = exc
+            self.batches += 1
+            self.items += 1
+            _resolve(pending.future, outcome)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "window_ms": self.window_ms,
+            "max_size": self.max_size,
+            "commits": self.batches,
+            "calls": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+#the caller may have gone away (cancelled request), its outcome is then dropped
+def _resolve(future: asyncio.Future, outcome):
+    if future.done():
+        return
+    if isinstance(outcome, BaseException):
+        future.set_exception(outcome)
+    else:
+        future.set_result(outcome)
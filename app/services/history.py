@@ -0,0 +1,170 @@
+import base64
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import read_sessionmaker
+from app.core.serialization import dumps, status_label, type_label
+from app.models.domain import Transaction
+from app.services.card_directory import get_card
+
+transactions = Transaction.__table__
+
+HISTORY_COLUMNS = (
+    transactions.c.id,
+    transactions.c.ref_number,
+    transactions.c.amount,
+    transactions.c.fee_amount,
+    transactions.c.status,
+    transactions.c.type,
+    transactions.c.created_at,
+)
+
+
+async def resolve_card_id(db: AsyncSession, card_number: str) -> Optional[int]:
+    card = await get_card(db, card_number)
+    return card.id if card else None
+
+
+#opaque cursor = position of the last row of the previous page
+def encode_cursor(created_at: datetime, tx_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{tx_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, tx_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(tx_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+#lower created_at bound for history and exports without a start, lets postgres skip older partitions
+def lookback_start() -> Optional[datetime]:
+    if not settings.HISTORY_LOOKBACK_DAYS:
+        return None
+    return datetime.now(timezone.utc) - timedelta(days=settings.HISTORY_LOOKBACK_DAYS)
+
+
+def _side(column, card_id: int, after: Optional[Tuple[datetime, int]], limit: int, since: Optional[datetime]):
+    query = select(*HISTORY_COLUMNS).where(column == card_id)
+    if since:
+        query = query.where(transactions.c.created_at >= since)
+    if after:
+        created_at, tx_id = after
+        #split form of (created_at, id) < (:c, :i) so the (card_id, created_at) index bounds the scan
+        query = query.where(
+            transactions.c.created_at <= created_at,
+            or_(transactions.c.created_at < created_at, transactions.c.id < tx_id)
+        )
+    return query.order_by(transactions.c.created_at.desc(), transactions.c.id.desc()).limit(limit)
+
+
+#newest first page of a card's transactions, each side is one index range scan of at most limit + 1 rows
+async def history_page(
+    db: AsyncSession,
+    card_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    include_incoming: bool = False
+):
+    after = decode_cursor(cursor) if cursor else None
+    since = lookback_start()
+    query = _side(transactions.c.source_card_id, card_id, after, limit + 1, since)
+
+    if include_incoming:
+        both = union_all(
+            query,
+            _side(transactions.c.dest_card_id, card_id, after, limit + 1, since)
+        ).subquery()
+        query = (
+            select(both)
+            .order_by(both.c.created_at.desc(), both.c.id.desc())
+            .limit(limit + 1)
+        )
+
+    rows = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, next_cursor
+
+
+EXPORT_FIELDS = ["ref_number", "type", "status", "direction", "amount", "fee", "total_amount", "date"]
+
+
+def _export_query(card_id: int, start: Optional[datetime], end: Optional[datetime], include_incoming: bool):
+    start = start or lookback_start()
+
+    def side(column):
+        query = select(
+            *HISTORY_COLUMNS,
+            transactions.c.total_amount,
+            (transactions.c.source_card_id == card_id).label("outgoing")
+        ).where(column == card_id)
+        if start:
+            query = query.where(transactions.c.created_at >= start)
+        if end:
+            query = query.where(transactions.c.created_at <= end)
+        return query
+
+    query = side(transactions.c.source_card_id)
+    if include_incoming:
+        both = union_all(query, side(transactions.c.dest_card_id)).subquery()
+        return select(both).order_by(both.c.created_at, both.c.id)
+    return query.order_by(transactions.c.created_at, transactions.c.id)
+
+
+def _export_record(row) -> dict:
+    return {
+        "ref_number": row.ref_number or "N/A",
+        "type": type_label(row.type),
+        "status": status_label(row.status),
+        "direction": "out" if row.outgoing else "in",
+        "amount": row.amount,
+        "fee": row.fee_amount,
+        "total_amount": row.total_amount,
+        "date": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+#yields encoded chunks of a statement; rows come through a server-side cursor
+#EXPORT_FETCH_SIZE at a time, so memory does not depend on the date range
+async def export_statement(
+    card_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    include_incoming: bool,
+    fmt: str
+):
+    if fmt == "csv":
+        header = io.StringIO()
+        csv.writer(header).writerow(EXPORT_FIELDS)
+        yield header.getvalue()
+
+    query = _export_query(card_id, start, end, include_incoming)
+
+    factory = await read_sessionmaker()
+    async with factory() as db:
+        async with db.begin():
+            result = await db.stream(query.execution_options(yield_per=settings.EXPORT_FETCH_SIZE))
+            async for rows in result.partitions():
+                if fmt == "csv":
+                    chunk = io.StringIO()
+                    writer = csv.DictWriter(chunk, fieldnames=EXPORT_FIELDS)
+                    for row in rows:
+                        writer.writerow(_export_record(row))
+                    yield chunk.getvalue()
+                else:
+                    yield b"".join(dumps(_export_record(row)) + b"\n" for row in rows)
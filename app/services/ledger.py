@@ -0,0 +1,166 @@
+import random
+from typing import Optional
+
+from sqlalchemy import Text, cast, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.domain import Account, AccountBalanceSlot, Transaction
+from app.services.transaction_feed import FEED_CHANNEL
+
+#core tables, statements on them skip the orm identity map and unit of work
+accounts = Account.__table__
+balance_slots = AccountBalanceSlot.__table__
+transactions = Transaction.__table__
+
+#first unlocked slot, starting from a random one so concurrent credits spread out
+CREDIT_SLOT_SQL = text("""
+    UPDATE account_balance_slots SET balance = account_balance_slots.balance + :amount
+    WHERE account_id = :account_id AND slot = (
+        SELECT slot FROM account_balance_slots
+        WHERE account_id = :account_id
+        ORDER BY (slot + :slots - :start) % :slots
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING slot
+""")
+
+#moves every slot into accounts.balance, old.balance is the value before the reset
+SWEEP_SLOTS_SQL = text("""
+    WITH swept AS (
+        UPDATE account_balance_slots s SET balance = 0
+        FROM (
+            SELECT slot, balance FROM account_balance_slots
+            WHERE account_id = :account_id AND balance <> 0
+            FOR UPDATE
+        ) old
+        WHERE s.account_id = :account_id AND s.slot = old.slot
+        RETURNING old.balance
+    )
+    UPDATE accounts SET balance = accounts.balance + COALESCE((SELECT SUM(balance) FROM swept), 0)
+    WHERE accounts.id = :account_id
+    RETURNING accounts.balance
+""")
+
+
+#locks the given accounts by primary key in one statement, always in id order
+#so opposite transfers between the same accounts cannot deadlock
+async def lock_accounts(db: AsyncSession, account_ids: list) -> dict:
+    result = await db.execute(
+        select(accounts.c.id, accounts.c.balance)
+        .where(accounts.c.id.in_(account_ids))
+        .order_by(accounts.c.id)
+        .with_for_update()
+    )
+    return {row.id: row.balance for row in result}
+
+
+#conditional debit, returns the new balance or None when the balance is too low
+async def debit_account(db: AsyncSession, account_id: int, amount: int) -> Optional[int]:
+    result = await db.execute(
+        update(accounts)
+        .where(accounts.c.id == account_id, accounts.c.balance >= amount)
+        .values(balance=accounts.c.balance - amount)
+        .returning(accounts.c.balance)
+    )
+    return result.scalar_one_or_none()
+
+
+async def credit_account(db: AsyncSession, account_id: int, amount: int) -> Optional[int]:
+    result = await db.execute(
+        update(accounts)
+        .where(accounts.c.id == account_id)
+        .values(balance=accounts.c.balance + amount)
+        .returning(accounts.c.balance)
+    )
+    return result.scalar_one_or_none()
+
+
+#credit to a sharded account, takes one slot row lock instead of the account row lock
+async def credit_account_slot(db: AsyncSession, account_id: int, slots: int, amount: int):
+    start = random.randrange(slots)
+    params = {"account_id": account_id, "amount": amount, "slots": slots, "start": start}
+    if (await db.execute(CREDIT_SLOT_SQL, params)).scalar_one_or_none() is not None:
+        return
+
+    #every slot is busy, wait for the random one
+    result = await db.execute(
+        update(balance_slots)
+        .where(balance_slots.c.account_id == account_id, balance_slots.c.slot == start)
+        .values(balance=balance_slots.c.balance + amount)
+        .returning(balance_slots.c.slot)
+    )
+    if result.scalar_one_or_none() is None:
+        #slots were removed since the card metadata was cached
+        await credit_account(db, account_id, amount)
+
+
+#folds the slots of a locked account into its main balance, returns the new balance
+async def sweep_slots(db: AsyncSession, account_id: int) -> Optional[int]:
+    result = await db.execute(SWEEP_SLOTS_SQL, {"account_id": account_id})
+    return result.scalar_one_or_none()
+
+
+#"<source card id>,<dest card id>|<json>": listeners match the card ids without parsing the json
+def _feed_payload():
+    t = transactions.c
+    return func.concat(
+        t.source_card_id, ",", t.dest_card_id, "|",
+        cast(func.json_build_object(
+            "ref_number", t.ref_number,
+            "amount", t.amount,
+            "fee", t.fee_amount,
+            "status", t.status,
+            "type", t.type,
+            "date", t.created_at
+        ), Text)
+    )
+
+
+#pg_notify runs inside RETURNING, so the live feed event costs no extra round trip and postgres
+#only delivers it once the transaction commits. The notify queue lock is taken once per committing
+#transaction, so a group-commit batch pays it once for all its rows
+def _returning():
+    columns = [transactions.c.id, transactions.c.ref_number, transactions.c.created_at]
+    if settings.TRANSACTION_STREAM_ENABLED:
+        columns.append(func.pg_notify(FEED_CHANNEL, _feed_payload()).label("notified"))
+    return columns
+
+
+async def insert_transaction(db: AsyncSession, **values):
+    result = await db.execute(
+        insert(transactions)
+        .values(**values)
+        .returning(*_returning())
+    )
+    return result.one()
+
+
+#applies {account_id: delta} for a batch in one statement, accounts must already be locked
+async def apply_balance_deltas(db: AsyncSession, deltas: dict):
+    deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    await db.execute(
+        text(
+            "UPDATE accounts SET balance = accounts.balance + v.delta "
+            "FROM unnest(CAST(:ids AS integer[]), CAST(:deltas AS bigint[])) AS v(id, delta) "
+            "WHERE accounts.id = v.id"
+        ),
+        {"ids": list(deltas.keys()), "deltas": list(deltas.values())}
+    )
+
+
+#multi-row insert, returns {ref_number: row}
+async def insert_transactions(db: AsyncSession, rows: list) -> dict:
+    if not rows:
+        return {}
+
+    result = await db.execute(
+        insert(transactions)
+        .values(rows)
+        .returning(*_returning())
+    )
+    return {row.ref_number: row for row in result}
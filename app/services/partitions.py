@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, apply_timeouts
+
+logger = logging.getLogger(__name__)
+
+PARENT = "transactions"
+DEFAULT_PARTITION = "transactions_default"
+PARTITION_NAME = re.compile(r"^transactions_y(\d{4})m(\d{2})$")
+
+LIST_PARTITIONS_SQL = text("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:parent AS regclass)
+""")
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"transactions_y{month.year}m{month.month:02d}"
+
+
+#bounds are utc midnights, the same ones the partitioning migration uses
+def partition_bounds(month: date):
+    low = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    high = add_months(month, 1)
+    return low, datetime(high.year, high.month, 1, tzinfo=timezone.utc)
+
+
+def _literal(value: datetime) -> str:
+    return "'" + value.isoformat() + "'"
+
+
+async def list_partitions(db: AsyncSession) -> List[date]:
+    result = await db.execute(LIST_PARTITIONS_SQL, {"parent": PARENT})
+    months = []
+    for (name,) in result:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+async def _create_partition(db: AsyncSession, month: date):
+    low, high = partition_bounds(month)
+    name = partition_name(month)
+
+    #rows that already landed in the default partition for this month have to move first,
+    #otherwise postgres refuses the new partition
+    result = await db.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :low AND created_at < :high)"),
+        {"low": low, "high": high}
+    )
+    stranded = result.scalar()
+
+    if stranded:
+        await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}"))
+
+    await db.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ({_literal(low)}) TO ({_literal(high)})"
+    ))
+
+    if stranded:
+        await db.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :low AND created_at < :high RETURNING *) "
+                f"INSERT INTO {PARENT} SELECT * FROM moved"
+            ),
+            {"low": low, "high": high}
+        )
+        await db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+    logger.info("created partition %s%s", name, " (moved rows out of the default partition)" if stranded else "")
+
+
+#creates the monthly partitions from start up to months_ahead past the current month, returns the new ones
+async def ensure_partitions(db: AsyncSession, start: Optional[date] = None, months_ahead: Optional[int] = None) -> List[str]:
+    if months_ahead is None:
+        months_ahead = settings.PARTITION_MONTHS_AHEAD
+
+    current = month_start(datetime.now(timezone.utc))
+    month = month_start(start) if start else current
+    last = add_months(current, months_ahead)
+
+    created = []
+    async with db.begin():
+        await apply_timeouts(db)
+        existing = set(await list_partitions(db))
+        while month <= last:
+            if month not in existing:
+                await _create_partition(db, month)
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+    return created
+
+
+#detaches partitions that end before the retention window; with archive=True they are moved
+#into PARTITION_ARCHIVE_SCHEMA, otherwise they stay next to the parent as plain tables.
+#a partition is only let go once the rollup watermark has passed all of its rows
+async def detach_partitions(db: AsyncSession, retention_months: int, archive: bool = False) -> List[str]:
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+    detached = []
+
+    async with db.begin():
+        await apply_timeouts(db)
+        result = await db.execute(text("SELECT last_transaction_id FROM rollup_watermarks WHERE name = 'transactions'"))
+        watermark = result.scalar() or 0
+
+        if archive:
+            await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {settings.PARTITION_ARCHIVE_SCHEMA}"))
+
+        for month in await list_partitions(db):
+            if month >= cutoff:
+                break
+            name = partition_name(month)
+
+            result = await db.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name} WHERE id > :watermark)"), {"watermark": watermark})
+            if result.scalar():
+                logger.warning("keeping partition %s, it has rows the rollups have not folded in yet", name)
+                continue
+
+            await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            if archive:
+                await db.execute(text(f"ALTER TABLE {name} SET SCHEMA {settings.PARTITION_ARCHIVE_SCHEMA}"))
+            detached.append(name)
+
+    return detached
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintain the monthly transactions partitions")
+    parser.add_argument("--months-ahead", type=int, default=settings.PARTITION_MONTHS_AHEAD)
+    parser.add_argument(
+        "--retention-months",
+        type=int,
+        default=settings.PARTITION_RETENTION_MONTHS,
+        help="detach partitions older than this many months (unset keeps everything attached)"
+    )
+    parser.add_argument("--archive", action="store_true", help=f"move detached partitions into the {settings.PARTITION_ARCHIVE_SCHEMA} schema")
+    return parser.parse_args()
+
+
+async def _main(args):
+    async with AsyncSessionLocal() as db:
+        created = await ensure_partitions(db, months_ahead=args.months_ahead)
+        print(f"created partitions: {', '.join(created) or 'none'}")
+
+        if args.retention_months is not None:
+            detached = await detach_partitions(db, args.retention_months, args.archive)
+            print(f"{'archived' if args.archive else 'detached'} partitions: {', '.join(detached) or 'none'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(parse_args()))
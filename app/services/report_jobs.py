@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, delete, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, ReadSessionLocal, read_sessionmaker, replica_health
+from app.models.domain import ReportJob, ReportJobStatus
+from app.services.fees import get_fee_series, get_fee_total
+from app.services.reports import card_totals, success_counts, user_totals
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATUSES = (ReportJobStatus.PENDING.value, ReportJobStatus.RUNNING.value)
+STATUS_NAMES = {status.value: status.name.lower() for status in ReportJobStatus}
+PURGE_INTERVAL_SECONDS = 60
+MAX_ERROR_LENGTH = 1_000
+
+
+def _date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+async def _success_counts(db: AsyncSession, params: dict):
+    return await success_counts(db, params["grain"], _date(params["start"]), _date(params["end"]), params["limit"])
+
+
+async def _user_totals(db: AsyncSession, params: dict):
+    return await user_totals(
+        db, params["grain"], params["user_id"], _date(params["start"]), _date(params["end"]), params["limit"]
+    )
+
+
+async def _card_totals(db: AsyncSession, params: dict):
+    return await card_totals(
+        db, params["grain"], params["card_number"], _date(params["start"]), _date(params["end"]), params["limit"]
+    )
+
+
+#same shape as /transactions/fees-report without a transaction_id
+async def _fees(db: AsyncSession, params: dict):
+    start, end = _date(params["start"]), _date(params["end"])
+    report = {"total_fee_income": await get_fee_total(db, start, end)}
+    if params["grain"]:
+        report["series"] = await get_fee_series(db, start, end, params["grain"])
+    return report
+
+
+#kind -> (parameters with their defaults, runner)
+REPORT_KINDS = {
+    "success-counts": ({"grain": "hour", "start": None, "end": None, "limit": 1000}, _success_counts),
+    "users": ({"grain": "month", "user_id": None, "start": None, "end": None, "limit": 1000}, _user_totals),
+    "cards": ({"grain": "month", "card_number": None, "start": None, "end": None, "limit": 1000}, _card_totals),
+    "fees": ({"grain": None, "start": None, "end": None}, _fees),
+}
+
+
+#only the kind's own parameters, defaults filled in and aware dates in utc, so requests that
+#mean the same report hash to the same key
+def normalize_params(kind: str, values: dict) -> dict:
+    defaults, _ = REPORT_KINDS[kind]
+    params = {}
+    for name, default in defaults.items():
+        value = values.get(name)
+        if value is None:
+            value = default
+        if isinstance(value, datetime):
+            value = (value.astimezone(timezone.utc) if value.tzinfo else value).isoformat()
+        params[name] = value
+    return params
+
+
+def params_key(kind: str, params: dict) -> str:
+    payload = json.dumps([kind, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def job_view(job: ReportJob, with_result: bool = False) -> dict:
+    view = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": STATUS_NAMES[job.status],
+        "params": job.params,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "expires_at": job.expires_at,
+        "error": job.error,
+    }
+    if with_result:
+        view["result"] = job.result
+    return view
+
+
+#a live job for the same parameters, or a finished one whose result has not expired
+async def _reusable_job(db: AsyncSession, key: str) -> Optional[ReportJob]:
+    result = await db.execute(
+        select(ReportJob)
+        .options(defer(ReportJob.result))
+        .where(
+            ReportJob.params_key == key,
+            or_(
+                ReportJob.status.in_(LIVE_STATUSES),
+                and_(ReportJob.status == ReportJobStatus.DONE.value, ReportJob.expires_at > func.now())
+            )
+        )
+        .order_by(ReportJob.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def submit_job(db: AsyncSession, kind: str, values: dict) -> dict:
+    params = normalize_params(kind, values)
+    key = params_key(kind, params)
+
+    #a concurrent identical submit loses on uq_report_jobs_live_key and picks up the winner's job
+    #on the next pass; the last pass covers a winner that finished and failed in between
+    for _ in range(3):
+        async with db.begin():
+            job = await _reusable_job(db, key)
+            if job is None:
+                result = await db.execute(
+                    insert(ReportJob)
+                    .values(
+                        id=uuid.uuid4().hex,
+                        kind=kind,
+                        params_key=key,
+                        params=params,
+                        status=ReportJobStatus.PENDING.value,
+                        attempts=0
+                    )
+                    .on_conflict_do_nothing(index_elements=["params_key"], index_where=text("status IN (0, 1)"))
+                    .returning(ReportJob)
+                )
+                job = result.scalar_one_or_none()
+            if job is not None:
+                view = job_view(job)
+                break
+    else:
+        raise HTTPException(status_code=503, detail="Could not submit the report job, please try again")
+
+    if view["status"] == "pending":
+        report_workers.wake()
+    return view
+
+
+#finished results are only served until they expire
+async def get_job(db: AsyncSession, job_id: str) -> Optional[dict]:
+    result = await db.execute(
+        select(ReportJob).where(
+            ReportJob.id == job_id,
+            or_(ReportJob.expires_at.is_(None), ReportJob.expires_at > func.now())
+        )
+    )
+    job = result.scalar_one_or_none()
+    return job_view(job, with_result=True) if job is not None else None
+
+
+#oldest pending job, or a running one whose worker went away (started more than twice the
+#job timeout ago) and still has attempts left; SKIP LOCKED lets workers in every process claim
+#from the same table
+async def claim_job(db: AsyncSession):
+    stale = func.now() - timedelta(seconds=2 * settings.REPORT_JOB_TIMEOUT_SECONDS)
+    candidate = (
+        select(ReportJob.id)
+        .where(or_(
+            ReportJob.status == ReportJobStatus.PENDING.value,
+            and_(
+                ReportJob.status == ReportJobStatus.RUNNING.value,
+                ReportJob.started_at < stale,
+                ReportJob.attempts < settings.REPORT_JOB_MAX_ATTEMPTS
+            )
+        ))
+        .order_by(ReportJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with db.begin():
+        result = await db.execute(
+            update(ReportJob)
+            .where(ReportJob.id == candidate)
+            .values(status=ReportJobStatus.RUNNING.value, started_at=func.now(), attempts=ReportJob.attempts + 1)
+            .returning(ReportJob.id, ReportJob.kind, ReportJob.params, ReportJob.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        return result.one_or_none()
+
+
+#expired results go away, stale jobs that ran out of attempts are failed so they stop blocking their key
+async def purge_jobs(db: AsyncSession):
+    stale = func.now() - timedelta(seconds=2 * settings.REPORT_JOB_TIMEOUT_SECONDS)
+    async with db.begin():
+        await db.execute(
+            update(ReportJob)
+            .where(
+                ReportJob.status == ReportJobStatus.RUNNING.value,
+                ReportJob.started_at < stale,
+                ReportJob.attempts >= settings.REPORT_JOB_MAX_ATTEMPTS
+            )
+            .values(
+                status=ReportJobStatus.FAILED.value,
+                error=f"gave up after {settings.REPORT_JOB_MAX_ATTEMPTS} attempts",
+                finished_at=func.now(),
+                expires_at=func.now() + timedelta(seconds=settings.REPORT_JOB_TTL_SECONDS)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(ReportJob)
+            .where(ReportJob.expires_at < func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def _run_read_only(runner, params: dict):
+    factory = await read_sessionmaker()
+    async with factory() as db:
+        try:
+            async with db.begin():
+                await db.execute(text("SET TRANSACTION READ ONLY"))
+                return await runner(db, params)
+        except (OSError, OperationalError, InterfaceError):
+            if factory is ReadSessionLocal:
+                replica_health.mark_down()
+            raise
+
+
+#the attempts check keeps a worker that was presumed dead from overwriting a reclaimed run
+async def _finish(job, status: ReportJobStatus, **values):
+    async with AsyncSessionLocal() as db:
+        async with db.begin():
+            await db.execute(
+                update(ReportJob)
+                .where(
+                    ReportJob.id == job.id,
+                    ReportJob.status == ReportJobStatus.RUNNING.value,
+                    ReportJob.attempts == job.attempts
+                )
+                .values(
+                    status=status.value,
+                    finished_at=func.now(),
+                    expires_at=func.now() + timedelta(seconds=settings.REPORT_JOB_TTL_SECONDS),
+                    **values
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+
+#hands a job cut off by shutdown back to the queue
+async def _requeue(job):
+    async with AsyncSessionLocal() as db:
+        async with db.begin():
+            await db.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job.id, ReportJob.attempts == job.attempts)
+                .values(status=ReportJobStatus.PENDING.value, attempts=ReportJob.attempts - 1)
+                .execution_options(synchronize_session=False)
+            )
+
+
+async def run_job(job) -> bool:
+    _, runner = REPORT_KINDS[job.kind]
+    try:
+        result = await asyncio.wait_for(_run_read_only(runner, job.params), settings.REPORT_JOB_TIMEOUT_SECONDS)
+    except asyncio.CancelledError:
+        try:
+            await _requeue(job)
+        except Exception:
+            logger.exception("could not requeue report job %s", job.id)
+        raise
+    except asyncio.TimeoutError:
+        await _finish(job, ReportJobStatus.FAILED, error=f"timed out after {settings.REPORT_JOB_TIMEOUT_SECONDS}s")
+        return False
+    except Exception as exc:
+        logger.exception("report job %s failed", job.id)
+        await _finish(job, ReportJobStatus.FAILED, error=(str(exc) or type(exc).__name__)[:MAX_ERROR_LENGTH])
+        return False
+
+    await _finish(job, ReportJobStatus.DONE, result=jsonable_encoder(result))
+    return True
+
+
+#a fixed number of workers claiming jobs from report_jobs; submits in this process wake them,
+#jobs submitted elsewhere are picked up on the next poll
+class ReportWorkerPool:
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = settings.REPORT_JOB_WORKERS if workers is None else workers
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(index)) for index in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, index: int):
+        loop = asyncio.get_running_loop()
+        last_purge = None
+        while True:
+            #cleared before claiming, so a submit that lands mid-claim is not missed
+            self._wakeup.clear()
+            job = None
+            try:
+                #one worker per process is enough for the cleanup
+                if index == 0 and (last_purge is None or loop.time() - last_purge >= PURGE_INTERVAL_SECONDS):
+                    last_purge = loop.time()
+                    async with AsyncSessionLocal() as db:
+                        await purge_jobs(db)
+                async with AsyncSessionLocal() as db:
+                    job = await claim_job(db)
+                if job is not None:
+                    await self._execute(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("report worker failed")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.REPORT_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job):
+        self.running += 1
+        try:
+            if await run_job(job):
+                self.completed += 1
+            else:
+                self.failed += 1
+        finally:
+            self.running -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+report_workers = ReportWorkerPool()
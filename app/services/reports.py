@@ -0,0 +1,101 @@
+from sqlalchemy import select, desc, asc
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+
+from app.models.domain import TransactionRollup, RollupScope, RollupGrain, User, Card
+
+GRAINS = {
+    "hour": RollupGrain.HOUR,
+    "day": RollupGrain.DAY,
+    "month": RollupGrain.MONTH,
+}
+
+
+def rollup_filters(scope: RollupScope, grain: str, start: Optional[datetime], end: Optional[datetime]):
+    filters = [
+        TransactionRollup.scope == scope.value,
+        TransactionRollup.grain == GRAINS[grain].value,
+    ]
+    if start:
+        filters.append(TransactionRollup.bucket >= start)
+    if end:
+        filters.append(TransactionRollup.bucket <= end)
+    return filters
+
+
+# successful transactions per bucket (query 1 in queries.txt)
+async def success_counts(db: AsyncSession, grain: str, start: Optional[datetime], end: Optional[datetime], limit: int) -> list:
+    result = await db.execute(
+        select(TransactionRollup.bucket, TransactionRollup.tx_count)
+        .where(*rollup_filters(RollupScope.GLOBAL, grain, start, end), TransactionRollup.scope_id == 0)
+        .order_by(desc(TransactionRollup.bucket))
+        .limit(limit)
+    )
+    return [
+        {"bucket": row.bucket, "transaction_count": row.tx_count}
+        for row in result
+    ]
+
+
+# totals per user (query 2 in queries.txt)
+async def user_totals(
+    db: AsyncSession,
+    grain: str,
+    user_id: Optional[int],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    limit: int
+) -> list:
+    filters = rollup_filters(RollupScope.USER, grain, start, end)
+    if user_id is not None:
+        filters.append(TransactionRollup.scope_id == user_id)
+
+    result = await db.execute(
+        select(User.id, User.full_name, TransactionRollup.bucket, TransactionRollup.amount_sum, TransactionRollup.tx_count)
+        .join(User, User.id == TransactionRollup.scope_id)
+        .where(*filters)
+        .order_by(asc(User.full_name), desc(TransactionRollup.bucket))
+        .limit(limit)
+    )
+    return [
+        {
+            "user_id": row.id,
+            "full_name": row.full_name,
+            "bucket": row.bucket,
+            "total_amount": row.amount_sum,
+            "transaction_count": row.tx_count
+        }
+        for row in result
+    ]
+
+
+# totals per source card (query 3 in queries.txt)
+async def card_totals(
+    db: AsyncSession,
+    grain: str,
+    card_number: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    limit: int
+) -> list:
+    filters = rollup_filters(RollupScope.CARD, grain, start, end)
+    if card_number is not None:
+        filters.append(Card.card_number == card_number)
+
+    result = await db.execute(
+        select(Card.card_number, TransactionRollup.bucket, TransactionRollup.amount_sum, TransactionRollup.tx_count)
+        .join(Card, Card.id == TransactionRollup.scope_id)
+        .where(*filters)
+        .order_by(desc(TransactionRollup.amount_sum))
+        .limit(limit)
+    )
+    return [
+        {
+            "card_number": row.card_number,
+            "bucket": row.bucket,
+            "total_amount": row.amount_sum,
+            "transaction_count": row.tx_count
+        }
+        for row in result
+    ]
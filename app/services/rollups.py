@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import Interval, cast, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.domain import RollupWatermark, Transaction
+from app.services.fees import refresh_fee_buckets
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "transactions"
+
+#every successful transaction lands in 3 grains x (global, source card, owner of the source card)
+ROLLUP_SQL = text("""
+    INSERT INTO transaction_rollups (scope, grain, scope_id, bucket, tx_count, amount_sum, fee_sum)
+    SELECT g.scope, g.grain, g.scope_id, g.bucket, COUNT(*), SUM(s.amount), SUM(s.fee)
+    FROM (
+        SELECT t.amount, COALESCE(t.fee_amount, 0) AS fee, t.created_at, c.id AS card_id, a.user_id
+        FROM transactions t
+        LEFT JOIN cards c ON c.id = t.source_card_id
+        LEFT JOIN accounts a ON a.id = c.account_id
+        WHERE t.id > :low AND t.id <= :high
+          AND t.status = 1
+          AND NOT t.imported
+          AND t.created_at IS NOT NULL
+    ) s
+    CROSS JOIN LATERAL (VALUES
+        (0, 1, 0, date_trunc('hour', s.created_at)),
+        (0, 2, 0, date_trunc('day', s.created_at)),
+        (0, 3, 0, date_trunc('month', s.created_at)),
+        (1, 1, s.card_id, date_trunc('hour', s.created_at)),
+        (1, 2, s.card_id, date_trunc('day', s.created_at)),
+        (1, 3, s.card_id, date_trunc('month', s.created_at)),
+        (2, 1, s.user_id, date_trunc('hour', s.created_at)),
+        (2, 2, s.user_id, date_trunc('day', s.created_at)),
+        (2, 3, s.user_id, date_trunc('month', s.created_at))
+    ) AS g(scope, grain, scope_id, bucket)
+    WHERE g.scope_id IS NOT NULL
+    GROUP BY g.scope, g.grain, g.scope_id, g.bucket
+    ON CONFLICT (scope, grain, scope_id, bucket) DO UPDATE SET
+        tx_count = transaction_rollups.tx_count + excluded.tx_count,
+        amount_sum = transaction_rollups.amount_sum + excluded.amount_sum,
+        fee_sum = transaction_rollups.fee_sum + excluded.fee_sum
+""")
+
+
+async def _lock_watermark(db: AsyncSession) -> int:
+    await db.execute(
+        insert(RollupWatermark)
+        .values(name=WATERMARK_NAME, last_transaction_id=0)
+        .on_conflict_do_nothing(index_elements=[RollupWatermark.name])
+    )
+    result = await db.execute(
+        select(RollupWatermark.last_transaction_id)
+        .where(RollupWatermark.name == WATERMARK_NAME)
+        .with_for_update()
+    )
+    return result.scalar_one()
+
+
+#folds at most ROLLUP_BATCH_SIZE new transaction ids into the rollups, returns the new watermark
+#rows younger than ROLLUP_GRACE_SECONDS are left for the next run so in-flight inserts are not skipped
+async def refresh_rollups_once(db: AsyncSession) -> int:
+    async with db.begin():
+        low = await _lock_watermark(db)
+
+        cutoff = func.now() - cast(timedelta(seconds=settings.ROLLUP_GRACE_SECONDS), Interval)
+        next_ids = (
+            select(Transaction.id)
+            .where(Transaction.id > low, Transaction.created_at < cutoff)
+            .order_by(Transaction.id)
+            .limit(settings.ROLLUP_BATCH_SIZE)
+            .subquery()
+        )
+        result = await db.execute(select(func.max(next_ids.c.id)))
+        high = result.scalar()
+        if high is None:
+            return low
+
+        await db.execute(ROLLUP_SQL, {"low": low, "high": high})
+        await refresh_fee_buckets(db, low, high)
+        await db.execute(
+            update(RollupWatermark)
+            .where(RollupWatermark.name == WATERMARK_NAME)
+            .values(last_transaction_id=high, updated_at=func.now())
+        )
+        return high
+
+
+async def refresh_rollups(db: AsyncSession) -> int:
+    last = None
+    while True:
+        current = await refresh_rollups_once(db)
+        if current == last:
+            return current
+        last = current
+
+
+async def rollup_refresh_loop():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await refresh_rollups(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("rollup refresh failed")
+        await asyncio.sleep(settings.ROLLUP_REFRESH_INTERVAL_SECONDS)
+
+
+async def _main():
+    async with AsyncSessionLocal() as db:
+        watermark = await refresh_rollups(db)
+    print(f"rollups are up to date with transaction id {watermark}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Optional, Set
+
+import asyncpg
+from fastapi import HTTPException
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.core.serialization import dumps, status_label, type_label
+
+logger = logging.getLogger(__name__)
+
+#see app/services/ledger.py for the payload
+FEED_CHANNEL = "transaction_feed"
+
+HEARTBEAT = b": keepalive\n\n"
+#sent after the listen connection was lost: events may have been missed, clients should refetch history
+RESET = b"event: reset\ndata: {}\n\n"
+MAX_RECONNECT_DELAY_SECONDS = 30
+
+
+def listen_dsn() -> str:
+    url = make_url(settings.TRANSACTION_STREAM_LISTEN_URL or settings.DATABASE_URL)
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def render_event(body: str, direction: str) -> bytes:
+    event = json.loads(body)
+    event["status"] = status_label(event["status"])
+    event["type"] = type_label(event["type"])
+    event["direction"] = direction
+    return b"event: transaction\ndata: " + dumps(event) + b"\n\n"
+
+
+class _Subscriber:
+    __slots__ = ("card_id", "queue")
+
+    def __init__(self, card_id: int, queue_size: int):
+        self.card_id = card_id
+        self.queue = asyncio.Queue(queue_size)
+
+
+#fans the notifications of one shared LISTEN connection out to the SSE subscribers of this worker.
+#every subscriber has a bounded queue of rendered messages; one that falls a full queue behind is
+#dropped instead of buffering for it. An idle subscriber is just its queue waiting on get(),
+#heartbeats come from the listener loop rather than a timer per subscriber
+class TransactionFeed:
+
+    def __init__(self, queue_size: Optional[int] = None, max_subscribers: Optional[int] = None):
+        self.queue_size = queue_size or settings.TRANSACTION_STREAM_QUEUE_SIZE
+        self.max_subscribers = max_subscribers or settings.TRANSACTION_STREAM_MAX_SUBSCRIBERS
+
+        self._subscribers: Dict[int, Set[_Subscriber]] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self.subscriber_count = 0
+        self.connected = False
+
+        self.notifications = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    def start(self):
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        await asyncio.gather(self._runner, return_exceptions=True)
+        self._runner = None
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                self._close(subscriber)
+
+    def subscribe(self, card_id: int) -> _Subscriber:
+        if not self.running:
+            raise HTTPException(status_code=503, detail="Transaction stream is not available")
+        if self.subscriber_count >= self.max_subscribers:
+            raise HTTPException(status_code=503, detail="Too many open streams, please try again", headers={"Retry-After": "5"})
+
+        subscriber = _Subscriber(card_id, self.queue_size)
+        self._subscribers.setdefault(card_id, set()).add(subscriber)
+        self.subscriber_count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        subscribers = self._subscribers.get(subscriber.card_id)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.card_id]
+        self.subscriber_count -= 1
+
+    #sse body for one subscriber, ends when it is dropped or the feed stops
+    async def events(self, subscriber: _Subscriber):
+        try:
+            yield HEARTBEAT
+            while True:
+                message = await subscriber.queue.get()
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    #the queue is emptied so the end marker always fits
+    def _close(self, subscriber: _Subscriber):
+        self.unsubscribe(subscriber)
+        queue = subscriber.queue
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def _offer(self, subscriber: _Subscriber, message: bytes):
+        try:
+            subscriber.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._close(subscriber)
+            return
+        self.delivered += 1
+
+    def _broadcast(self, message: bytes):
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                self._offer(subscriber, message)
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        self.notifications += 1
+        if not self._subscribers:
+            return
+        cards, _, body = payload.partition("|")
+        source, _, dest = cards.partition(",")
+        for card_id, direction in ((source, "out"), (dest, "in")):
+            if not card_id:
+                continue
+            subscribers = self._subscribers.get(int(card_id))
+            if not subscribers:
+                continue
+            message = render_event(body, direction)
+            for subscriber in list(subscribers):
+                self._offer(subscriber, message)
+
+    async def _run(self):
+        delay = 1
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(listen_dsn())
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(FEED_CHANNEL, self._on_notify)
+                self.connected = True
+                delay = 1
+
+                #the heartbeat doubles as a liveness check of the listen connection
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), settings.TRANSACTION_STREAM_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        await connection.fetchval("SELECT 1", timeout=settings.TRANSACTION_STREAM_HEARTBEAT_SECONDS)
+                        self._broadcast(HEARTBEAT)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("transaction feed listener failed")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+
+            self.reconnects += 1
+            self._broadcast(RESET)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "connected": self.connected,
+            "subscribers": self.subscriber_count,
+            "cards": len(self._subscribers),
+            "notifications": self.notifications,
+            "delivered": self.delivered,
+            "dropped_slow": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+transaction_feed = TransactionFeed()
@@ -0,0 +1,283 @@
+import codecs
+import csv
+import json
+import logging
+from typing import AsyncIterator, Optional, Tuple, Union
+
+import asyncpg
+from pydantic import ValidationError
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.domain import TransactionStatus, TransactionType
+from app.schemas.api_schemas import BIGINT_MAX, TransactionImportRow
+from app.services.card_directory import get_cards
+from app.services.fees import note_fees_landed
+
+logger = logging.getLogger(__name__)
+
+#advisory lock key for the merge step ("IMP"): concurrent imports of the same file cannot both
+#see a ref_number as new
+IMPORT_LOCK_KEY = 0x494D50
+
+STAGING_TABLE = "transactions_import"
+STAGING_COLUMNS = [
+    "line", "source_card_id", "dest_card_id", "amount", "fee_amount", "total_amount",
+    "type", "status", "ref_number", "description", "created_at",
+]
+
+#per chunk transaction, so it also works behind a transaction pooler
+CREATE_STAGING_SQL = text(f"""
+    CREATE TEMP TABLE {STAGING_TABLE} (
+        line integer NOT NULL,
+        source_card_id integer,
+        dest_card_id integer,
+        amount bigint NOT NULL,
+        fee_amount bigint NOT NULL,
+        total_amount bigint NOT NULL,
+        type smallint NOT NULL,
+        status smallint NOT NULL,
+        ref_number text NOT NULL,
+        description text,
+        created_at timestamptz NOT NULL
+    ) ON COMMIT DROP
+""")
+
+#the ref_number unique index also covers created_at (the partition key), so duplicates are filtered here:
+#refs already in transactions are skipped, and within the chunk the first line wins
+MERGE_SQL = text(f"""
+    INSERT INTO transactions (source_card_id, dest_card_id, amount, fee_amount, total_amount, type, status, ref_number, description, created_at, imported)
+    SELECT DISTINCT ON (s.ref_number)
+        s.source_card_id, s.dest_card_id, s.amount, s.fee_amount, s.total_amount, s.type, s.status, s.ref_number, s.description, s.created_at, true
+    FROM {STAGING_TABLE} s
+    WHERE NOT EXISTS (SELECT 1 FROM transactions t WHERE t.ref_number = s.ref_number)
+    ORDER BY s.ref_number, s.line
+    RETURNING ref_number, created_at
+""")
+
+TYPES = {"transfer": TransactionType.CARD_TO_CARD.value, "withdraw": TransactionType.WITHDRAW.value}
+STATUSES = {"SUCCESS": TransactionStatus.SUCCESS.value, "FAILED": TransactionStatus.FAILED.value}
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []
+        #earliest created_at among the inserted rows
+        self.earliest = None
+
+    def fail(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < settings.IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+#(line number, text) from a byte stream; a line over IMPORT_MAX_LINE_LENGTH comes back as None,
+#whether it arrived in one network chunk or several. The rest of a line that outgrows the buffer is
+#skipped, so one bad line cannot make the buffer grow without bound
+async def _lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    limit = settings.IMPORT_MAX_LINE_LENGTH
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    skipping = False
+    line_no = 0
+
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line_no += 1
+            line = line.rstrip("\r")
+            if skipping:
+                skipping = False
+                yield line_no, None
+            else:
+                yield line_no, line if len(line) <= limit else None
+        #one more character for the \r of a crlf line ending
+        if len(pending) > limit + 1:
+            pending = ""
+            skipping = True
+
+    pending = (pending + decoder.decode(b"", final=True)).rstrip("\r")
+    if pending or skipping:
+        yield line_no + 1, None if skipping or len(pending) > limit else pending
+
+
+#(line number, field dict or error message) per data line, blank lines are skipped.
+#csv takes the field names from its header line and expects one record per line
+async def _records(stream: AsyncIterator[bytes], format: str) -> AsyncIterator[Tuple[int, Union[dict, str]]]:
+    header = None
+    async for line_no, line in _lines(stream):
+        if line is None:
+            yield line_no, f"line is longer than {settings.IMPORT_MAX_LINE_LENGTH} characters"
+            continue
+        if not line.strip():
+            continue
+
+        if format == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_no, f"invalid JSON: {exc}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, "expected a JSON object"
+                continue
+            yield line_no, record
+            continue
+
+        try:
+            values = next(csv.reader([line]))
+        except csv.Error as exc:
+            yield line_no, f"invalid CSV: {exc}"
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, f"expected {len(header)} fields, got {len(values)}"
+            continue
+        yield line_no, dict(zip(header, values))
+
+
+def _validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def _validate(record: dict) -> Union[TransactionImportRow, str]:
+    #empty csv cells and json nulls fall back to the field defaults
+    values = {key: value for key, value in record.items() if value not in ("", None)}
+    try:
+        row = TransactionImportRow(**values)
+    except ValidationError as exc:
+        return _validation_error(exc)
+
+    #total_amount is a bigint too
+    if row.amount + row.fee > BIGINT_MAX:
+        return "amount + fee is out of range"
+    #the other side of a transfer can be a card outside this bank
+    if row.type == "transfer" and row.source_card_number is None and row.dest_card_number is None:
+        return "a transfer needs source_card_number or dest_card_number"
+    if row.type == "withdraw" and (row.source_card_number is None or row.dest_card_number is not None):
+        return "a withdraw needs source_card_number and no dest_card_number"
+    return row
+
+
+#the raw COPY raises asyncpg errors, everything else comes wrapped in DBAPIError
+DB_ERRORS = (DBAPIError, asyncpg.PostgresError)
+
+
+#a chunk the database rejected (bad data COPY did not accept, a statement timeout) is reported
+#line by line and the import goes on with the next one; earlier chunks are already committed
+def _chunk_failed(report: ImportReport, lines: list, exc: Exception):
+    message = str(getattr(exc, "orig", None) or exc).strip()
+    message = message.splitlines()[0] if message else type(exc).__name__
+    logger.warning("import chunk of %s rows not loaded: %s", len(lines), message)
+    for line in lines:
+        report.fail(line, f"chunk not loaded: {message}")
+
+
+#card numbers -> ids, COPY into the staging table, merge; returns nothing, the report is updated
+async def _load_chunk(db: AsyncSession, chunk: list, report: ImportReport):
+    numbers = set()
+    for _, row in chunk:
+        numbers.update(number for number in (row.source_card_number, row.dest_card_number) if number)
+
+    try:
+        async with db.begin():
+            cards = await get_cards(db, list(numbers))
+    except DB_ERRORS as exc:
+        _chunk_failed(report, [line for line, _ in chunk], exc)
+        return
+
+    records = []
+    for line, row in chunk:
+        source = cards.get(row.source_card_number) if row.source_card_number else None
+        dest = cards.get(row.dest_card_number) if row.dest_card_number else None
+        if row.source_card_number and source is None:
+            report.fail(line, "source_card_number: card not found")
+            continue
+        if row.dest_card_number and dest is None:
+            report.fail(line, "dest_card_number: card not found")
+            continue
+        records.append((
+            line,
+            source.id if source else None,
+            dest.id if dest else None,
+            row.amount,
+            row.fee,
+            row.amount + row.fee,
+            TYPES[row.type],
+            STATUSES[row.status],
+            row.ref_number,
+            row.description,
+            row.date,
+        ))
+    if not records:
+        return
+
+    try:
+        async with db.begin():
+            connection = await db.connection()
+            raw = await connection.get_raw_connection()
+            await db.execute(CREATE_STAGING_SQL)
+            await raw.driver_connection.copy_records_to_table(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+            await db.execute(select(func.pg_advisory_xact_lock(IMPORT_LOCK_KEY)))
+            result = await db.execute(MERGE_SQL)
+            inserted = result.all()
+    except DB_ERRORS as exc:
+        _chunk_failed(report, [record[0] for record in records], exc)
+        return
+
+    report.inserted += len(inserted)
+    report.duplicates += len(records) - len(inserted)
+    if inserted:
+        earliest = min(row.created_at for row in inserted)
+        report.earliest = earliest if report.earliest is None else min(report.earliest, earliest)
+
+
+#loads a csv or ndjson body chunk by chunk while it is still arriving. Rows that do not parse or
+#validate are reported by line and skipped, the rest of the file still loads. Imported rows are
+#history only (transactions.imported): balances, daily limits and the live feed are not touched
+async def import_transactions(db: AsyncSession, stream: AsyncIterator[bytes], format: str) -> dict:
+    report = ImportReport()
+    chunk = []
+
+    async for line_no, record in _records(stream, format):
+        report.rows += 1
+        row = _validate(record) if isinstance(record, dict) else record
+        if isinstance(row, str):
+            report.fail(line_no, row)
+            continue
+
+        chunk.append((line_no, row))
+        if len(chunk) >= settings.IMPORT_CHUNK_SIZE:
+            await _load_chunk(db, chunk, report)
+            chunk = []
+
+    if chunk:
+        await _load_chunk(db, chunk, report)
+
+    #imported rows are mostly back-dated, cached fee results of closed ranges after them are dropped too
+    if report.inserted:
+        note_fees_landed(report.earliest)
+    return report.as_dict()
@@ -1,11 +1,35 @@
-from sqlalchemy import select, func, and_
+import asyncio
+from collections import defaultdict
+from typing import NamedTuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
-from datetime import datetime, time
 
-from app.models.domain import Card, Account, Transaction, TransactionType, TransactionStatus
+from app.models.domain import TransactionType, TransactionStatus
 from app.core.config import settings
-from app.core.security import verify_password
+from app.core.ids import next_ref
+from app.core.security import verify_password_async
+from app.schemas.api_schemas import validate_transfer_amount
+from app.services.fees import note_fees_landed
+from app.services.daily_spend import add_daily_spend, add_daily_spend_bulk, get_daily_spend_for_update
+from app.core.database import run_in_transaction
+from app.services.admission import admission
+from app.services.card_directory import get_cards, unusable_reason
+from app.services.group_commit import GroupCommitter
+from app.services.ledger import (
+    lock_accounts,
+    debit_account,
+    credit_account,
+    credit_account_slot,
+    sweep_slots,
+    insert_transaction,
+    insert_transactions,
+    apply_balance_deltas,
+)
+
+
+def calculate_fee(amount: int) -> int:
+    calculated_fee = int(amount * settings.TRANSACTION_FEE_PERCENTAGE)
+    return min(calculated_fee, settings.MAX_TRANSACTION_FEE)
 
 
 async def process_transfer(
@@ -18,85 +42,351 @@ async def process_transfer(
     if source_card_num == dest_card_num:
         raise HTTPException(status_code=400, detail="Source and destination cards cannot be the same")
 
+    #card metadata comes from the directory cache, the pin is checked before any row lock is taken
     async with db.begin():
-        source_q = await db.execute(
-            select(Card, Account)
-            .join(Account, Card.account_id == Account.id)
-            .where(Card.card_number == source_card_num)
-            .with_for_update()
-        )
-        source_data = source_q.first()
-
-        if not source_data:
-            raise HTTPException(status_code=404, detail="Source card not found")
-
-        src_card, src_account = source_data
-
-        if not verify_password(pin, src_card.hashed_pin):
-            raise HTTPException(status_code=403, detail="Invalid PIN")
-
-        dest_q = await db.execute(
-            select(Card, Account)
-            .join(Account, Card.account_id == Account.id)
-            .where(Card.card_number == dest_card_num)
-            .with_for_update()
-        )
-        dest_data = dest_q.first()
-
-        if not dest_data:
-            raise HTTPException(status_code=404, detail="Destination card not found")
-
-        dst_card, dst_account = dest_data
-
-        calculated_fee = int(amount * settings.TRANSACTION_FEE_PERCENTAGE)
-        fee = min(calculated_fee, settings.MAX_TRANSACTION_FEE)
-
-        total_deduction = amount + fee
-
-        if src_account.balance < total_deduction:
-            raise HTTPException(status_code=400, detail="Insufficient account balance")
-
-        today_start = datetime.combine(datetime.now().date(), time.min)
-
-        daily_sum_q = await db.execute(
-            select(func.sum(Transaction.amount))
-            .where(
-                and_(
-                    Transaction.source_card_id == src_card.id,
-                    Transaction.created_at >= today_start,
-                    Transaction.status == TransactionStatus.SUCCESS.value,
-                    Transaction.type == TransactionType.CARD_TO_CARD.value
-                )
-            )
-        )
-        current_daily_sum = daily_sum_q.scalar() or 0
-
-        if (current_daily_sum + amount) > settings.DAILY_TRANSACTION_LIMIT:
-            raise HTTPException(status_code=400, detail="Daily transaction limit (50,000,000 Tomans) has been reached")
-
-        src_account.balance -= total_deduction
-        dst_account.balance += amount
-
-        new_tx = Transaction(
-            source_card_id=src_card.id,
-            dest_card_id=dst_card.id,
-            amount=amount,
-            fee_amount=fee,
-            total_amount=total_deduction,
-            type=TransactionType.CARD_TO_CARD.value,
-            status=TransactionStatus.SUCCESS.value,
-            ref_number=f"TRX-{int(datetime.now().timestamp() * 1000)}",
-            description="Card-to-card transfer"
-        )
-        db.add(new_tx)
-
-        return {
-            "ref_number": new_tx.ref_number,
-            "amount": amount,
-            "fee": fee,
+        found = await get_cards(db, [source_card_num, dest_card_num])
+
+    src_card = found.get(source_card_num)
+    if not src_card:
+        raise HTTPException(status_code=404, detail="Source card not found")
+
+    if not await verify_password_async(pin, src_card.hashed_pin):
+        raise HTTPException(status_code=403, detail="Invalid PIN")
+
+    reason = unusable_reason(src_card)
+    if reason:
+        raise HTTPException(status_code=403, detail=f"Source card {reason}")
+
+    dst_card = found.get(dest_card_num)
+    if not dst_card:
+        raise HTTPException(status_code=404, detail="Destination card not found")
+
+    #the group committer bounds its own db concurrency, the direct path waits for its accounts in-process
+    if transfer_committer.running:
+        result = await transfer_committer.submit(src_card, dst_card, amount)
+    else:
+        async with admission.admit(locked_account_ids(src_card, dst_card)):
+            result = await run_in_transaction(db, apply_transfer, src_card, dst_card, amount)
+    note_fees_landed()
+    return result
+
+
+#a sharded destination is credited through one of its slots, its account row stays unlocked
+def locked_account_ids(src_card, dst_card) -> list:
+    account_ids = [src_card.account_id]
+    if not dst_card.account_slots:
+        account_ids.append(dst_card.account_id)
+    return account_ids
+
+
+#money movement of one transfer, must run inside an open db transaction
+async def apply_transfer(db: AsyncSession, src_card, dst_card, amount: int):
+    balances = await lock_accounts(db, locked_account_ids(src_card, dst_card))
+
+    fee = calculate_fee(amount)
+    total_deduction = amount + fee
+
+    balance = balances.get(src_card.account_id, 0)
+    if src_card.account_slots and balance < total_deduction:
+        balance = await sweep_slots(db, src_card.account_id)
+
+    if balance < total_deduction:
+        raise HTTPException(status_code=400, detail="Insufficient account balance")
+
+    within_limit = await add_daily_spend(
+        db,
+        src_card.id,
+        amount,
+        TransactionType.CARD_TO_CARD,
+        limit=settings.DAILY_TRANSACTION_LIMIT
+    )
+
+    if not within_limit:
+        raise HTTPException(status_code=400, detail="Daily transaction limit (50,000,000 Tomans) has been reached")
+
+    await debit_account(db, src_card.account_id, total_deduction)
+    if dst_card.account_slots:
+        await credit_account_slot(db, dst_card.account_id, dst_card.account_slots, amount)
+    else:
+        await credit_account(db, dst_card.account_id, amount)
+
+    new_tx = await insert_transaction(
+        db,
+        source_card_id=src_card.id,
+        dest_card_id=dst_card.id,
+        amount=amount,
+        fee_amount=fee,
+        total_amount=total_deduction,
+        type=TransactionType.CARD_TO_CARD.value,
+        status=TransactionStatus.SUCCESS.value,
+        ref_number=next_ref("TRX"),
+        description="Card-to-card transfer"
+    )
+
+    return {
+        "ref_number": new_tx.ref_number,
+        "amount": amount,
+        "fee": fee,
+        "status": "SUCCESS",
+        "date": new_tx.created_at,
+        "type": "transfer",
+        "source": src_card.card_number,
+        "destination": dst_card.card_number
+    }
+
+
+class _GroupItem(NamedTuple):
+    source_card_number: str
+    dest_card_number: str
+    amount: int
+
+
+#group commit batch of (src_card, dst_card, amount) calls, settled like a batch transfer
+#and answered per call with the single transfer response or its error
+async def apply_transfer_group(db: AsyncSession, calls: list) -> list:
+    items = []
+    cards = {}
+    for src_card, dst_card, amount in calls:
+        items.append(_GroupItem(src_card.card_number, dst_card.card_number, amount))
+        cards[src_card.card_number] = src_card
+        cards[dst_card.card_number] = dst_card
+
+    outcome = await apply_transfer_batch(db, items, list(range(len(items))), cards)
+
+    results = []
+    for index, item in enumerate(items):
+        result = outcome[index]
+        if result["status"] != "SUCCESS":
+            results.append(HTTPException(status_code=400, detail=result["error"]))
+            continue
+        results.append({
+            "ref_number": result["ref_number"],
+            "amount": item.amount,
+            "fee": result["fee"],
             "status": "SUCCESS",
-            "date": datetime.now(),
+            "date": result["date"],
             "type": "transfer",
-            "source": src_card.card_number,
-            "destination": dst_card.card_number
+            "source": item.source_card_number,
+            "destination": item.dest_card_number
+        })
+    return results
+
+
+transfer_committer = GroupCommitter(apply_transfer_group, apply_transfer)
+
+
+def _failed_item(index: int, amount: int, error: str) -> dict:
+    return {"index": index, "status": "FAILED", "amount": amount, "fee": 0, "error": error}
+
+
+async def process_transfer_batch(db: AsyncSession, items: list):
+    results = {}
+    pending = []
+
+    for index, item in enumerate(items):
+        if item.source_card_number == item.dest_card_number:
+            results[index] = _failed_item(index, item.amount, "Source and destination cards cannot be the same")
+            continue
+        try:
+            validate_transfer_amount(item.amount)
+        except ValueError as exc:
+            results[index] = _failed_item(index, item.amount, str(exc))
+            continue
+        pending.append(index)
+
+    card_numbers = set()
+    for index in pending:
+        card_numbers.update((items[index].source_card_number, items[index].dest_card_number))
+
+    async with db.begin():
+        found = await get_cards(db, list(card_numbers))
+
+    #every distinct (card, pin) pair is verified once, a few at a time to stay inside the hash pool queue
+    checks = {}
+    for index in pending:
+        item = items[index]
+        src_card = found.get(item.source_card_number)
+        if src_card:
+            checks[(item.source_card_number, item.pin)] = src_card.hashed_pin
+
+    verified = {}
+    keys = list(checks)
+    for start in range(0, len(keys), settings.PIN_HASH_WORKERS):
+        chunk = keys[start:start + settings.PIN_HASH_WORKERS]
+        outcomes = await asyncio.gather(*(verify_password_async(pin, checks[(card, pin)]) for card, pin in chunk))
+        verified.update(zip(chunk, outcomes))
+
+    unusable = {card_number: unusable_reason(card) for card_number, card in found.items()}
+
+    accepted = []
+    for index in pending:
+        item = items[index]
+        if item.source_card_number not in found:
+            results[index] = _failed_item(index, item.amount, "Source card not found")
+        elif not verified.get((item.source_card_number, item.pin)):
+            results[index] = _failed_item(index, item.amount, "Invalid PIN")
+        elif unusable[item.source_card_number]:
+            results[index] = _failed_item(index, item.amount, f"Source card {unusable[item.source_card_number]}")
+        elif item.dest_card_number not in found:
+            results[index] = _failed_item(index, item.amount, "Destination card not found")
+        else:
+            accepted.append(index)
+
+    if accepted:
+        #the batch locks its accounts in id order in one statement, it only takes a global slot
+        async with admission.admit():
+            results.update(await run_in_transaction(db, apply_transfer_batch, items, accepted, found))
+        note_fees_landed()
+
+    ordered = [results[index] for index in range(len(items))]
+    succeeded = sum(1 for result in ordered if result["status"] == "SUCCESS")
+
+    return {
+        "succeeded": succeeded,
+        "failed": len(ordered) - succeeded,
+        "results": ordered
+    }
+
+
+#settles already verified items in one db transaction, items are applied in request order
+async def apply_transfer_batch(db: AsyncSession, items: list, accepted: list, cards: dict) -> dict:
+    account_ids = set()
+    for index in accepted:
+        account_ids.update((cards[items[index].source_card_number].account_id, cards[items[index].dest_card_number].account_id))
+
+    balances = await lock_accounts(db, list(account_ids))
+
+    #every account row is locked here, so sharded sources are folded into their main balance
+    #and sharded destinations are credited on the main row like any other
+    sharded = set()
+    for index in accepted:
+        src_card = cards[items[index].source_card_number]
+        if src_card.account_slots:
+            sharded.add(src_card.account_id)
+    for account_id in sorted(sharded):
+        balances[account_id] = await sweep_slots(db, account_id)
+
+    source_ids = list({cards[items[index].source_card_number].id for index in accepted})
+    daily = await get_daily_spend_for_update(db, source_ids, TransactionType.CARD_TO_CARD)
+
+    deltas = defaultdict(int)
+    daily_added = defaultdict(int)
+    rows = []
+    outcome = {}
+
+    for index in accepted:
+        item = items[index]
+        src_card = cards[item.source_card_number]
+        dst_card = cards[item.dest_card_number]
+
+        fee = calculate_fee(item.amount)
+        total_deduction = item.amount + fee
+
+        if balances.get(src_card.account_id, 0) < total_deduction:
+            outcome[index] = _failed_item(index, item.amount, "Insufficient account balance")
+            continue
+
+        if daily.get(src_card.id, 0) + item.amount > settings.DAILY_TRANSACTION_LIMIT:
+            outcome[index] = _failed_item(index, item.amount, "Daily transaction limit (50,000,000 Tomans) has been reached")
+            continue
+
+        balances[src_card.account_id] -= total_deduction
+        balances[dst_card.account_id] = balances.get(dst_card.account_id, 0) + item.amount
+        deltas[src_card.account_id] -= total_deduction
+        deltas[dst_card.account_id] += item.amount
+        daily[src_card.id] = daily.get(src_card.id, 0) + item.amount
+        daily_added[src_card.id] += item.amount
+
+        ref_number = next_ref("TRX")
+        rows.append({
+            "source_card_id": src_card.id,
+            "dest_card_id": dst_card.id,
+            "amount": item.amount,
+            "fee_amount": fee,
+            "total_amount": total_deduction,
+            "type": TransactionType.CARD_TO_CARD.value,
+            "status": TransactionStatus.SUCCESS.value,
+            "ref_number": ref_number,
+            "description": "Card-to-card transfer"
+        })
+        outcome[index] = {
+            "index": index,
+            "status": "SUCCESS",
+            "amount": item.amount,
+            "fee": fee,
+            "ref_number": ref_number
         }
+
+    await apply_balance_deltas(db, deltas)
+    await add_daily_spend_bulk(db, daily_added, TransactionType.CARD_TO_CARD)
+    inserted = await insert_transactions(db, rows)
+
+    for result in outcome.values():
+        if result["status"] == "SUCCESS":
+            result["date"] = inserted[result["ref_number"]].created_at
+
+    return outcome
+
+
+async def process_withdraw(
+    db: AsyncSession,
+    card_num: str,
+    amount: int
+):
+    async with db.begin():
+        card = (await get_cards(db, [card_num])).get(card_num)
+
+    if not card:
+        raise HTTPException(status_code=404, detail="Card not found")
+
+    reason = unusable_reason(card)
+    if reason:
+        raise HTTPException(status_code=403, detail=f"Card {reason}")
+
+    async with admission.admit([card.account_id]):
+        return await run_in_transaction(db, apply_withdraw, card, amount)
+
+
+async def apply_withdraw(db: AsyncSession, card, amount: int):
+    if card.account_slots:
+        balance = (await lock_accounts(db, [card.account_id])).get(card.account_id, 0)
+        if balance < amount:
+            await sweep_slots(db, card.account_id)
+
+    #account row before the daily counter row, the order transfers take them in, so a withdraw and
+    #a transfer from the same card cannot deadlock; a failed limit check rolls the debit back
+    if await debit_account(db, card.account_id, amount) is None:
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+
+    within_limit = await add_daily_spend(
+        db,
+        card.id,
+        amount,
+        TransactionType.WITHDRAW,
+        limit=settings.DAILY_WITHDRAW_LIMIT
+    )
+
+    if not within_limit:
+        raise HTTPException(status_code=400, detail="Daily withdraw limit has been reached")
+
+    new_tx = await insert_transaction(
+        db,
+        source_card_id=card.id,
+        dest_card_id=None,
+        amount=amount,
+        fee_amount=0,
+        total_amount=amount,
+        type=TransactionType.WITHDRAW.value,
+        status=TransactionStatus.SUCCESS.value,
+        ref_number=next_ref("WD"),
+        description="withdraw money"
+    )
+
+    return {
+        "ref_number": new_tx.ref_number,
+        "amount": amount,
+        "fee": 0,
+        "status": "SUCCESS",
+        "date": new_tx.created_at,
+        "type": "withdraw"
+    }
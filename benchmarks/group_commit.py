@@ -0,0 +1,106 @@
+"""
+Transfers per second against commits per second, with each transfer in its
+own transaction (window 0) and with the group-commit scheduler collecting
+transfers for a few milliseconds (apply_transfer_group).
+
+Runs against the database in DATABASE_URL and moves real money between
+seeded cards, so point it at a benchmark database. PINs are not checked.
+
+    python -m benchmarks.group_commit --transfers 5000 --concurrency 128 --windows 0 1 2 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from sqlalchemy import event, select
+
+from app.core.database import AsyncSessionLocal, engine, run_in_transaction
+from app.models.domain import Card
+from app.services.card_directory import get_cards
+from app.services.group_commit import GroupCommitter
+from app.services.transfer_service import apply_transfer, apply_transfer_group
+from benchmarks.stats import summarize
+
+commit_count = 0
+
+
+@event.listens_for(engine.sync_engine, "commit")
+def _count_commits(conn):
+    global commit_count
+    commit_count += 1
+
+
+async def run(window_ms, cards, total, concurrency, amount, max_size):
+    global commit_count
+    committer = None
+    if window_ms > 0:
+        committer = GroupCommitter(apply_transfer_group, apply_transfer, window_ms=window_ms, max_size=max_size)
+        committer.start()
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        src, dst = random.sample(cards, 2)
+        async with gate:
+            start = time.perf_counter()
+            try:
+                if committer:
+                    await committer.submit(src, dst, amount)
+                else:
+                    async with AsyncSessionLocal() as db:
+                        await run_in_transaction(db, apply_transfer, src, dst, amount)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    commit_count = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    commits = commit_count
+
+    if committer:
+        await committer.stop()
+
+    return {
+        "window_ms": window_ms,
+        "transfers": total,
+        "errors": errors,
+        "transfers_per_second": round(len(latencies) / elapsed, 1),
+        "commits_per_second": round(commits / elapsed, 1),
+        "transfers_per_commit": round(len(latencies) / commits, 2) if commits else 0.0,
+        "latency": summarize(latencies),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transfers", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--amount", type=int, default=1_000)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5])
+    parser.add_argument("--max-size", type=int, default=64)
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        card_numbers = list((await db.execute(select(Card.card_number))).scalars())
+        await db.rollback()
+        async with db.begin():
+            cards = list((await get_cards(db, card_numbers)).values())
+
+    results = []
+    for window_ms in args.windows:
+        results.append(await run(window_ms, cards, args.transfers, args.concurrency, args.amount, args.max_size))
+    await engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
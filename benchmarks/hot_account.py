@@ -0,0 +1,90 @@
+"""
+Credit throughput to one hot destination account with and without balance
+slots. Every transfer goes from a random seeded card to the same destination
+card; with 0 slots they all queue on the destination's account row lock, with
+N slots they spread over N slot rows.
+
+Runs against the database in DATABASE_URL, moves real money and changes the
+slot count of the destination account (it is set back to 0 at the end).
+
+    python -m benchmarks.hot_account --transfers 5000 --concurrency 64 --slots 0 4 16
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal, engine, run_in_transaction
+from app.models.domain import Card
+from app.services.balance_slots import set_balance_slots
+from app.services.card_directory import get_cards
+from app.services.transfer_service import apply_transfer
+from benchmarks.stats import summarize
+
+
+async def run(slots, hot_card, card_numbers, total, concurrency, amount):
+    async with AsyncSessionLocal() as db:
+        await set_balance_slots(db, hot_card.account_id, slots)
+        async with db.begin():
+            found = await get_cards(db, card_numbers + [hot_card.card_number])
+    hot = found[hot_card.card_number]
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        src = found[random.choice(card_numbers)]
+        async with gate:
+            async with AsyncSessionLocal() as db:
+                start = time.perf_counter()
+                try:
+                    await run_in_transaction(db, apply_transfer, src, hot, amount)
+                except Exception:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "slots": slots,
+        "transfers": total,
+        "errors": errors,
+        "throughput_tps": round(len(latencies) / elapsed, 1),
+        "latency": summarize(latencies),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transfers", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--amount", type=int, default=1_000)
+    parser.add_argument("--slots", type=int, nargs="+", default=[0, 4, 16])
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        cards = list((await db.execute(select(Card).order_by(Card.id))).scalars())
+    hot_card, sources = cards[0], [card.card_number for card in cards[1:] if card.account_id != cards[0].account_id]
+
+    results = []
+    try:
+        for slots in args.slots:
+            results.append(await run(slots, hot_card, sources, args.transfers, args.concurrency, args.amount))
+    finally:
+        async with AsyncSessionLocal() as db:
+            await set_balance_slots(db, hot_card.account_id, 0)
+        await engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Compare the ORM transfer path (lock Card+Account objects, mutate balances,
+flush through the unit of work) with the Core ledger path used by
+process_transfer (conditional UPDATE ... RETURNING).
+
+Runs against the database in DATABASE_URL and moves real money between
+seeded cards, so point it at a benchmark database.
+
+    python -m benchmarks.ledger_paths --transfers 2000 --concurrency 1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, time as dtime
+
+from sqlalchemy import and_, event, func, select
+
+from app.core.database import AsyncSessionLocal, engine, run_in_transaction
+from app.models.domain import Account, Card, Transaction, TransactionStatus, TransactionType
+from app.services.card_directory import get_cards
+from app.services.transfer_service import apply_transfer, calculate_fee
+from benchmarks.stats import summarize
+
+statement_count = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_statements(conn, cursor, statement, parameters, context, executemany):
+    global statement_count
+    statement_count += 1
+
+
+#the transfer path as it was before the core ledger, kept here only for comparison
+async def orm_transfer(db, source_card_num, dest_card_num, amount):
+    async with db.begin():
+        src_card, src_account = (await db.execute(
+            select(Card, Account)
+            .join(Account, Card.account_id == Account.id)
+            .where(Card.card_number == source_card_num)
+            .with_for_update()
+        )).first()
+        dst_card, dst_account = (await db.execute(
+            select(Card, Account)
+            .join(Account, Card.account_id == Account.id)
+            .where(Card.card_number == dest_card_num)
+            .with_for_update()
+        )).first()
+
+        fee = calculate_fee(amount)
+        today_start = datetime.combine(datetime.now().date(), dtime.min)
+        await db.execute(
+            select(func.sum(Transaction.amount)).where(
+                and_(
+                    Transaction.source_card_id == src_card.id,
+                    Transaction.created_at >= today_start,
+                    Transaction.status == TransactionStatus.SUCCESS.value,
+                    Transaction.type == TransactionType.CARD_TO_CARD.value
+                )
+            )
+        )
+
+        src_account.balance -= amount + fee
+        dst_account.balance += amount
+        db.add(Transaction(
+            source_card_id=src_card.id,
+            dest_card_id=dst_card.id,
+            amount=amount,
+            fee_amount=fee,
+            total_amount=amount + fee,
+            type=TransactionType.CARD_TO_CARD.value,
+            status=TransactionStatus.SUCCESS.value,
+            ref_number=f"BENCH-ORM-{time.time_ns()}-{random.random()}",
+            description="Card-to-card transfer"
+        ))
+
+
+async def core_transfer(db, source_card_num, dest_card_num, amount):
+    async with db.begin():
+        found = await get_cards(db, [source_card_num, dest_card_num])
+    await run_in_transaction(db, apply_transfer, found[source_card_num], found[dest_card_num], amount)
+
+
+async def run(name, transfer, card_numbers, total, concurrency, amount):
+    global statement_count
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        src, dst = random.sample(card_numbers, 2)
+        async with gate:
+            async with AsyncSessionLocal() as db:
+                start = time.perf_counter()
+                try:
+                    await transfer(db, src, dst, amount)
+                except Exception:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+    statement_count = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "path": name,
+        "transfers": total,
+        "errors": errors,
+        "throughput_tps": round(len(latencies) / elapsed, 1),
+        "statements_per_transfer": round(statement_count / max(total, 1), 2),
+        "latency": summarize(latencies),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transfers", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--amount", type=int, default=1_000)
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        card_numbers = list((await db.execute(select(Card.card_number))).scalars())
+
+    results = []
+    for name, transfer in (("orm", orm_transfer), ("core", core_transfer)):
+        results.append(await run(name, transfer, card_numbers, args.transfers, args.concurrency, args.amount))
+    await engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
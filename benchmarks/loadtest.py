@@ -0,0 +1,260 @@
+"""
+Mixed-workload load test for the Bank API.
+
+Drives transfer, withdraw, my-cards, history and fees-report calls either
+in-process against app.main:app or against a running server, with
+configurable concurrency and hot-card skew. Cards are read from the database
+in DATABASE_URL (seeded cards use PIN 1234), and lock waits are sampled from
+pg_stat_activity while the run is in progress.
+
+    python -m benchmarks.loadtest --duration 60 --concurrency 64 --skew 1.2
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --compare benchmarks/results/old.json
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import asyncpg
+import httpx
+
+from app.core.config import settings
+from benchmarks.stats import summarize
+
+DEFAULT_MIX = "transfer=30,withdraw=10,my-cards=20,history=30,fees=10"
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+#zipf-like weights over the cards, skew 0 is uniform
+class CardPicker:
+
+    def __init__(self, cards: list, skew: float, rng: random.Random):
+        self.cards = cards
+        self.rng = rng
+        weights = [1 / ((rank + 1) ** skew) for rank in range(len(cards))]
+        self.cumulative = list(itertools.accumulate(weights))
+
+    def pick(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.cards[bisect.bisect_left(self.cumulative, point)]
+
+    def pick_pair(self):
+        source = self.pick()
+        dest = self.pick()
+        while dest["card_number"] == source["card_number"] and len(self.cards) > 1:
+            dest = self.cards[self.rng.randrange(len(self.cards))]
+        return source, dest
+
+
+def build_request(kind: str, picker: CardPicker, args):
+    if kind == "transfer":
+        source, dest = picker.pick_pair()
+        return "POST", "/api/v1/transactions/transfer", {"json": {
+            "source_card_number": source["card_number"],
+            "dest_card_number": dest["card_number"],
+            "amount": args.amount,
+            "pin": args.pin,
+        }}
+    if kind == "withdraw":
+        card = picker.pick()
+        return "POST", "/api/v1/transactions/withdraw", {"json": {
+            "card_number": card["card_number"],
+            "amount": args.amount,
+            "pin": args.pin,
+        }}
+    if kind == "my-cards":
+        card = picker.pick()
+        return "GET", "/api/v1/cards/my-cards", {"params": {"user_id": card["user_id"]}}
+    if kind == "history":
+        card = picker.pick()
+        return "GET", f"/api/v1/transactions/history/{card['card_number']}", {"params": {"limit": args.history_limit}}
+    if kind == "fees":
+        end = datetime.now()
+        start = end - timedelta(days=picker.rng.choice([1, 7, 30]))
+        return "GET", "/api/v1/transactions/fees-report", {"params": {
+            "start_date": start.isoformat(sep=" ", timespec="seconds"),
+            "end_date": end.isoformat(sep=" ", timespec="seconds"),
+        }}
+    raise ValueError(f"unknown workload {kind}")
+
+
+async def sample_lock_waits(dsn: str, interval: float, stop: asyncio.Event, totals: dict):
+    conn = await asyncpg.connect(dsn)
+    try:
+        while not stop.is_set():
+            waiting = await conn.fetchval(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE wait_event_type = 'Lock' AND datname = current_database()"
+            )
+            totals["lock_wait_seconds"] += waiting * interval
+            totals["max_lock_waiters"] = max(totals["max_lock_waiters"], waiting)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await conn.close()
+
+
+async def load_cards(dsn: str, limit: int) -> list:
+    conn = await asyncpg.connect(dsn)
+    try:
+        rows = await conn.fetch("SELECT card_number, user_id FROM cards ORDER BY id LIMIT $1", limit)
+    finally:
+        await conn.close()
+    return [dict(row) for row in rows]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+    rng = random.Random(args.seed)
+    cards = await load_cards(dsn, args.max_cards)
+    if len(cards) < 2:
+        raise SystemExit("need at least two cards, run seeder.py first")
+    rng.shuffle(cards)
+    picker = CardPicker(cards, args.skew, rng)
+
+    mix = parse_mix(args.mix)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+    client.headers["x-api-key"] = settings.API_KEY
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock_totals = {"lock_wait_seconds": 0.0, "max_lock_waiters": 0}
+    stop = asyncio.Event()
+    deadline = time.perf_counter() + args.duration
+    issued = itertools.count()
+
+    async def user():
+        while time.perf_counter() < deadline and next(issued) < args.requests:
+            kind = rng.choices(kinds, weights)[0]
+            method, url, kwargs = build_request(kind, picker, args)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = "error"
+            latencies[kind].append(time.perf_counter() - start)
+            statuses[kind][status] += 1
+
+    sampler = asyncio.create_task(sample_lock_waits(dsn, args.lock_sample_interval, stop, lock_totals))
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    await client.aclose()
+
+    endpoints = {}
+    for kind in kinds:
+        total = len(latencies[kind])
+        failed = sum(count for status, count in statuses[kind].items() if status == "error" or status >= 500)
+        rejected = sum(count for status, count in statuses[kind].items() if status != "error" and 400 <= status < 500)
+        endpoints[kind] = {
+            **summarize(latencies[kind]),
+            "throughput_rps": round(total / elapsed, 1),
+            "error_rate": round(failed / total, 4) if total else 0.0,
+            "rejected_rate": round(rejected / total, 4) if total else 0.0,
+            "statuses": {str(status): count for status, count in statuses[kind].items()},
+        }
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "target": args.base_url or "in-process",
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "skew": args.skew,
+            "cards": len(cards),
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(all_latencies) / elapsed, 1),
+        "overall": summarize(all_latencies),
+        "lock_wait_seconds": round(lock_totals["lock_wait_seconds"], 3),
+        "max_lock_waiters": lock_totals["max_lock_waiters"],
+        "endpoints": endpoints,
+    }
+
+
+def compare(current: dict, previous: dict):
+    print(f"\ncompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for kind, stats in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(kind)
+        if not before:
+            continue
+        for key in ("p50_ms", "p99_ms", "throughput_rps", "error_rate"):
+            old, new = before.get(key, 0), stats.get(key, 0)
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"  {kind:<10} {key:<15} {old:>10} -> {new:<10} {change}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default=None, help="run against a server instead of in-process")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--requests", type=int, default=10 ** 12, help="stop after this many requests")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--skew", type=float, default=1.0, help="zipf exponent of card popularity, 0 = uniform")
+    parser.add_argument("--max-cards", type=int, default=10_000)
+    parser.add_argument("--amount", type=int, default=1_000)
+    parser.add_argument("--pin", default="1234")
+    parser.add_argument("--history-limit", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--lock-sample-interval", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="defaults to benchmarks/results/<time>-<commit>.json")
+    parser.add_argument("--compare", default=None, help="previous result file to diff against")
+    args = parser.parse_args()
+
+    result = await run(args)
+    print(json.dumps(result, indent=2))
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{result['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump(result, fh, indent=2)
+    print(f"\nsaved {output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(result, json.load(fh))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
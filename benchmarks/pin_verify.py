@@ -0,0 +1,75 @@
+"""
+Compare inline bcrypt verification with the hash worker pool.
+
+Every simulated request verifies a PIN while a cheap "bystander" coroutine
+(standing in for /my-cards or /history) is scheduled next to it. Inline
+verification blocks the loop, so the bystanders inherit the bcrypt latency.
+
+    python -m benchmarks.pin_verify --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.core.security import (
+    get_password_hash,
+    verify_password,
+    verify_password_async,
+    shutdown_hash_executor,
+)
+from benchmarks.stats import summarize
+
+
+async def run(mode: str, hashed: str, total: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    verify_latency = []
+    bystander_latency = []
+
+    async def request():
+        async with gate:
+            start = time.perf_counter()
+            if mode == "inline":
+                verify_password("1234", hashed)
+            else:
+                await verify_password_async("1234", hashed)
+            verify_latency.append(time.perf_counter() - start)
+
+    async def bystander():
+        start = time.perf_counter()
+        await asyncio.sleep(0)
+        bystander_latency.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    tasks = []
+    for _ in range(total):
+        tasks.append(asyncio.create_task(request()))
+        tasks.append(asyncio.create_task(bystander()))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "throughput_rps": round(total / elapsed, 1),
+        "verify": summarize(verify_latency),
+        "bystander": summarize(bystander_latency),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    hashed = get_password_hash("1234")
+    results = []
+    for mode in ("inline", "pool"):
+        results.append(await run(mode, hashed, args.requests, args.concurrency))
+    shutdown_hash_executor()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
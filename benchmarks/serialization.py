@@ -0,0 +1,101 @@
+"""
+Rows per second for the history and my-cards response encoding, through
+response_model validation (what FastAPI does for a returned list) and through
+the fast path (app.core.serialization). No database needed.
+
+    python -m benchmarks.serialization --rows 100 --repeat 2000
+"""
+import argparse
+import json
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.core import serialization
+from app.core.serialization import card_rows, dumps, transaction_rows
+from app.schemas.api_schemas import CardResponse, TransactionResponse
+
+TransactionRow = namedtuple("TransactionRow", "id ref_number amount fee_amount status type created_at")
+CardRow = namedtuple("CardRow", "card_number iban balance")
+
+
+def sample_transactions(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        TransactionRow(
+            i,
+            f"TRX-{i:013d}",
+            random.randint(1_000, 500_000),
+            random.randint(0, 500),
+            random.choice((0, 1, 2)),
+            random.choice((1, 2)),
+            now - timedelta(seconds=i)
+        )
+        for i in range(count)
+    ]
+
+
+def sample_cards(count: int) -> list:
+    return [CardRow(f"6037991{i:09d}", f"IR{i:024d}", random.randint(0, 10**9)) for i in range(count)]
+
+
+def response_model_path(adapter: TypeAdapter, data: list) -> bytes:
+    validated = adapter.validate_python(data)
+    return json.dumps(adapter.dump_python(validated, mode="json", by_alias=True)).encode()
+
+
+#dates may differ only in how utc is spelled ("Z" or "+00:00")
+def same_documents(fast: bytes, slow: bytes) -> bool:
+    def load(body):
+        documents = json.loads(body)
+        for document in documents:
+            if "date" in document:
+                document["date"] = datetime.fromisoformat(document["date"].replace("Z", "+00:00"))
+        return documents
+    return load(fast) == load(slow)
+
+
+def measure(encode, repeat: int, rows: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode()
+    elapsed = time.perf_counter() - started
+    return {"rows_per_second": round(rows * repeat / elapsed), "us_per_response": round(elapsed / repeat * 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    transactions = sample_transactions(args.rows)
+    cards = sample_cards(args.rows)
+    history_adapter = TypeAdapter(List[TransactionResponse])
+    cards_adapter = TypeAdapter(List[CardResponse])
+
+    #both paths have to produce the same documents
+    assert same_documents(dumps(transaction_rows(transactions)), response_model_path(history_adapter, transaction_rows(transactions)))
+    assert same_documents(dumps(card_rows(cards)), response_model_path(cards_adapter, card_rows(cards)))
+
+    results = {
+        "encoder": "orjson" if serialization.orjson is not None else "json",
+        "rows": args.rows,
+        "history": {
+            "response_model": measure(lambda: response_model_path(history_adapter, transaction_rows(transactions)), args.repeat, args.rows),
+            "fast": measure(lambda: dumps(transaction_rows(transactions)), args.repeat, args.rows),
+        },
+        "my_cards": {
+            "response_model": measure(lambda: response_model_path(cards_adapter, card_rows(cards)), args.repeat, args.rows),
+            "fast": measure(lambda: dumps(card_rows(cards)), args.repeat, args.rows),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
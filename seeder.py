@@ -1,6 +1,10 @@
+import argparse
 import asyncio
 import random
+import time
+import asyncpg
 from sqlalchemy import select
+from app.core.config import settings
 from app.core.database import AsyncSessionLocal
 from app.models.domain import (
     User,
@@ -12,14 +16,29 @@ from app.models.domain import (
     EntityStatus,
 )
 from app.core.security import get_password_hash
+from app.services.partitions import ensure_partitions
 from datetime import datetime, timedelta
 
 NUM_USERS = 10
 NUM_TRANSACTIONS = 100_000
 
-async def seed_data():
+TRANSACTION_COLUMNS = [
+    "source_card_id",
+    "dest_card_id",
+    "amount",
+    "fee_amount",
+    "total_amount",
+    "type",
+    "status",
+    "ref_number",
+    "description",
+    "created_at",
+]
+
+async def seed_data(num_users: int = NUM_USERS, num_transactions: int = NUM_TRANSACTIONS):
     async with AsyncSessionLocal() as session:
         print("🌱 Start seeding database...")
+        await ensure_partitions(session, start=datetime.now() - timedelta(days=10))
 
         hashed_pin_1234 = get_password_hash("1234")
 
@@ -30,10 +49,10 @@ async def seed_data():
             return
 
         users = []
-        for i in range(NUM_USERS):
+        for i in range(num_users):
             user = User(
                 full_name=f"User {i}",
-                mobile=f"0912000000{i}",
+                mobile=f"09{i:09d}",
                 national_id=f"111111111{i}",
             )
             users.append(user)
@@ -73,15 +92,15 @@ async def seed_data():
 
         session.add_all(cards)
         await session.commit()
-        print(f"✅ Created {len(cards)} cards for {NUM_USERS} users.")
+        print(f"✅ Created {len(cards)} cards for {num_users} users.")
 
-        print(f"💸 Generating {NUM_TRANSACTIONS} Transactions...")
+        print(f"💸 Generating {num_transactions} Transactions...")
 
         card_result = await session.execute(select(Card))
         db_cards = card_result.scalars().all()
 
         transactions_batch = []
-        for i in range(NUM_TRANSACTIONS):
+        for i in range(num_transactions):
             src = random.choice(db_cards)
             dst = random.choice(db_cards)
 
@@ -96,7 +115,7 @@ async def seed_data():
                 total_amount=amount + fee,
                 type=TransactionType.CARD_TO_CARD.value,
                 status=TransactionStatus.SUCCESS.value,
-                ref_number=str(random.randint(100000000000, 999999999999)),
+                ref_number=f"SEED-{i}",
                 created_at=datetime.now() - timedelta(days=10)
             )
             transactions_batch.append(tx)
@@ -113,11 +132,161 @@ async def seed_data():
 
         print("\n✅ Done! Database seeded successfully.")
 
+def asyncpg_dsn() -> str:
+    return settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+def report(label: str, rows: int, started: float):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"   {label}: {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+def transaction_records(worker: int, count: int, num_cards: int, span_days: float, seed: int):
+    rng = random.Random(seed * 1_000 + worker)
+    now = datetime.now().astimezone()
+    span_seconds = span_days * 86_400
+
+    for i in range(count):
+        amount = rng.randint(1000, 500_000)
+        fee = int(amount * 0.001)
+        yield (
+            rng.randint(1, num_cards),
+            rng.randint(1, num_cards),
+            amount,
+            fee,
+            amount + fee,
+            TransactionType.CARD_TO_CARD.value,
+            TransactionStatus.SUCCESS.value,
+            f"SEED-{worker}-{i}",
+            "seeded transfer",
+            now - timedelta(seconds=rng.random() * span_seconds),
+        )
+
+def chunked(records, size: int):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+async def copy_transactions(worker: int, count: int, args) -> int:
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        records = transaction_records(worker, count, args.cards, args.days, args.seed)
+        for chunk in chunked(records, args.chunk_size):
+            await conn.copy_records_to_table("transactions", records=chunk, columns=TRANSACTION_COLUMNS)
+    finally:
+        await conn.close()
+    return count
+
+#bulk mode: users, accounts and cards with explicit ids, then transactions streamed
+#through COPY over several connections at once
+async def seed_data_copy(args):
+    print("🌱 Start seeding database (COPY mode)...")
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM users)"):
+            print("⚠️  Data already exists! You might want to drop tables first.")
+            return
+
+        rng = random.Random(args.seed)
+        hashed_pin_1234 = get_password_hash("1234")
+
+        started = time.perf_counter()
+        await conn.copy_records_to_table(
+            "users",
+            records=((i, f"User {i}", f"09{i:09d}", f"{i:010d}") for i in range(1, args.users + 1)),
+            columns=["id", "full_name", "mobile", "national_id"]
+        )
+        report("users", args.users, started)
+
+        #one account per card, card j belongs to user (j % users) + 1
+        started = time.perf_counter()
+        owners = [(j % args.users) + 1 for j in range(args.cards)]
+        await conn.copy_records_to_table(
+            "accounts",
+            records=(
+                (j, owners[j - 1], f"IR{j:024d}", rng.randint(10_000_000, 100_000_000), EntityStatus.ACTIVE.value)
+                for j in range(1, args.cards + 1)
+            ),
+            columns=["id", "user_id", "iban", "balance", "status"]
+        )
+        await conn.copy_records_to_table(
+            "cards",
+            records=(
+                (j, owners[j - 1], j, f"6037991{j:09d}", "1234", 12, 1405, EntityStatus.ACTIVE.value, hashed_pin_1234)
+                for j in range(1, args.cards + 1)
+            ),
+            columns=["id", "user_id", "account_id", "card_number", "cvv2", "expire_month", "expire_year", "status", "hashed_pin"]
+        )
+        report("accounts + cards", args.cards * 2, started)
+
+        for table in ("users", "accounts", "cards"):
+            await conn.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+    finally:
+        await conn.close()
+
+    #monthly partitions for the whole span, so nothing piles up in the default partition
+    async with AsyncSessionLocal() as session:
+        await ensure_partitions(session, start=datetime.now() - timedelta(days=args.days))
+
+    print(f"💸 Copying {args.transactions:,} transactions over {args.workers} connections...")
+    per_worker = [args.transactions // args.workers] * args.workers
+    per_worker[0] += args.transactions - sum(per_worker)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(copy_transactions(worker, count, args) for worker, count in enumerate(per_worker)))
+    report("transactions", args.transactions, started)
+
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        started = time.perf_counter()
+        await conn.execute("""
+            INSERT INTO card_daily_spend (card_id, day, transfer_amount, withdraw_amount)
+            SELECT source_card_id, created_at::date,
+                   COALESCE(SUM(amount) FILTER (WHERE type = 2), 0),
+                   COALESCE(SUM(amount) FILTER (WHERE type = 1), 0)
+            FROM transactions
+            WHERE status = 1 AND source_card_id IS NOT NULL
+            GROUP BY source_card_id, created_at::date
+            ON CONFLICT (card_id, day) DO UPDATE SET
+                transfer_amount = excluded.transfer_amount,
+                withdraw_amount = excluded.withdraw_amount
+        """)
+        await conn.execute("ANALYZE")
+        report("daily spend counters + analyze", args.transactions, started)
+    finally:
+        await conn.close()
+
+    print("✅ Done! Run `python -m app.services.rollups` to build the report rollups.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed the Bank API database")
+    parser.add_argument("--mode", choices=["orm", "copy"], default="orm")
+    parser.add_argument("--users", type=int, default=NUM_USERS)
+    parser.add_argument("--cards", type=int, default=None, help="copy mode only, defaults to 2 per user")
+    parser.add_argument("--transactions", type=int, default=NUM_TRANSACTIONS)
+    parser.add_argument("--days", type=float, default=30, help="copy mode: spread transactions over the last N days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=4, help="copy mode: parallel COPY connections")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    args = parser.parse_args()
+    if args.cards is None:
+        args.cards = args.users * 2
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
+
     try:
         loop = asyncio.get_running_loop()
     except RuntimeError:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
-    loop.run_until_complete(seed_data())
+    if args.mode == "copy":
+        loop.run_until_complete(seed_data_copy(args))
+    else:
+        random.seed(args.seed)
+        loop.run_until_complete(seed_data(args.users, args.transactions))